@@ -0,0 +1 @@
+from tests.conftest import fixture_server # noqa: F401, shared with the tests
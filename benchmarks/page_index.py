@@ -0,0 +1,55 @@
+"""Micro-benchmark: per-variable regex scans vs a single PageIndex scan.
+
+Run from the repository root: `python benchmarks/page_index.py`
+"""
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from zkparser.parser import PageIndex, get_eth_price
+
+
+PAGE = (Path(__file__).parent.parent / "tests" / "fixtures" / "era.html").read_bytes()
+# the str pages the old lookup scanned
+PAGE_TEXT = PAGE.decode()
+
+# every variable get_wallet_era_full reads
+ERA_VARIABLES = [
+        "value1_fixed_erarank", "value1", "value2", "value1_gasfees", "value3", "value4",
+        "valueUsdcPro1unfixed", "thresholdUsdcPro1", "valuePro1", "valuePro2",
+        "value1_lite_bal", "value5", "value1_gasfees_lite", "value1_lite_totalamount",
+        ]
+
+
+def regex_per_variable(page: str) -> list[str]:
+    # the lookup as it was before PageIndex: one fresh pattern and full scan per variable
+    values = []
+    for name in ERA_VARIABLES:
+        value = re.search(f"const {name} = ([a-zA-Z\\d\".;]+)", page).group(1)
+        values.append(value.split("//")[0].replace(";", "").replace('"', "").replace("None", "-1") or "0")
+    re.search("window.ethusd_price = ([\\d\".;]+)", page)
+
+    return values
+
+def page_index_lookup(page: bytes) -> list[str]:
+    index = PageIndex(page)
+    values = [index.value(name) for name in ERA_VARIABLES]
+    get_eth_price(page)
+
+    return values
+
+
+def main():
+    assert regex_per_variable(PAGE_TEXT) == page_index_lookup(PAGE)
+    number = 50
+    print(f"page size: {len(PAGE) / 1024:.0f} KiB, {len(ERA_VARIABLES) + 1} variables per wallet")
+    for func, page in ((regex_per_variable, PAGE_TEXT), (page_index_lookup, PAGE)):
+        best = min(timeit.repeat(lambda: func(page), number=number, repeat=5)) / number
+        print(f"{func.__name__:>20}: {best * 1000:.3f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Offline parser benchmarks over the page corpus in tests/fixtures.
+
+The corpus is synthetic until re-recorded from the live site (see
+tests/record_fixtures.py), so the numbers show relative costs, not the
+site's real pages.
+
+Run with `python -m pytest benchmarks`; pytest-benchmark's OPS column is wallets/sec
+for the parser benchmarks. Peak memory of one parse is in extra_info
+(`--benchmark-json` keeps it), along with sweep throughput.
+"""
+import asyncio
+import tracemalloc
+
+from pytest import fixture, mark
+
+from tests.fixture_server import FIXTURES
+from zkparser.bulk import get_wallets_many
+from zkparser.parser import Chain, PageIndex, page_index
+from zkparser.schema import declarations
+from zkparser.session import ZkSession
+from zkparser.zk import (
+        get_wallet_era,
+        get_wallet_era_full,
+        get_wallet_lite,
+        get_wallet_zero,
+        get_wallet_starknet,
+        get_wallet_scroll,
+        get_wallet_linea,
+        get_wallet_linea_mainnet,
+        get_wallet_linea_testnet,
+        get_wallet_sybil,
+        )
+
+
+WALLET = "0x686D64EDf5532912C2a1cd3a249b0e9363f81baD"
+
+PAGES = {
+        Chain.ERA: "era.html",
+        Chain.ZERO: "zero.html",
+        Chain.STARKNET: "starknet.html",
+        Chain.SCROLL: "scroll.html",
+        Chain.LINEA: "linea.html",
+        Chain.SYBIL: "sybil.html",
+        }
+
+LOOKUPS = [
+        get_wallet_era,
+        get_wallet_lite,
+        get_wallet_era_full,
+        get_wallet_zero,
+        get_wallet_starknet,
+        get_wallet_scroll,
+        get_wallet_linea,
+        get_wallet_linea_mainnet,
+        get_wallet_linea_testnet,
+        get_wallet_sybil,
+        ]
+
+# what each chain's parser reads: ("var", name) | ("row", index) | ("elem", id)
+FIELDS = {
+        Chain.ERA: [("var", "value1"), ("var", "value1_gasfees"), ("var", "window.ethusd_price"), ("row", 7)],
+        Chain.ZERO: [("var", "value1_fixed"), ("var", "valuePro9")],
+        Chain.STARKNET: [("var", "did_swap1Bool"), ("var", "lastTxPro1"), ("elem", "valueFirstTx1")],
+        Chain.SCROLL: [("var", "valuePro1"), ("var", "valuePro6")],
+        Chain.LINEA: [("var", "value1_unfixed_mn"), ("var", "valuePro53")],
+        Chain.SYBIL: [("var", "blacklisted12")],
+        }
+
+
+def load_page(chain: Chain) -> bytes:
+    return (FIXTURES / PAGES[chain]).read_bytes()
+
+@fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@mark.parametrize("lookup", LOOKUPS, ids=lambda lookup: lookup.__name__)
+def test_parse(benchmark, loop, lookup):
+    page = load_page(lookup.chain)
+
+    def parse():
+        page_index.cache_clear() # every round pays for scanning the page
+        declarations.cache_clear()
+        return loop.run_until_complete(lookup(WALLET, "", page))
+
+    assert parse() is not None
+    benchmark.extra_info["page_bytes"] = len(page)
+    benchmark.extra_info["peak_memory_bytes"] = peak_memory(parse)
+    benchmark(parse)
+
+@mark.parametrize("chain", list(PAGES), ids=lambda chain: chain.name)
+def test_scan(benchmark, chain):
+    page = load_page(chain)
+    benchmark.extra_info["peak_memory_bytes"] = peak_memory(lambda: PageIndex(page).variables)
+    benchmark(lambda: PageIndex(page).variables)
+
+@mark.parametrize("chain", list(PAGES), ids=lambda chain: chain.name)
+def test_schema_scan(benchmark, chain):
+    # the combined regex of the chain's schemas, stopping once every variable is found
+    page = load_page(chain)
+    benchmark(lambda: declarations.__wrapped__(chain, page))
+
+@mark.parametrize(
+        "chain, field",
+        [(chain, field) for chain, fields in FIELDS.items() for field in fields],
+        ids=lambda value: value.name if isinstance(value, Chain) else f"{value[0]}:{value[1]}",
+        )
+def test_field(benchmark, chain, field):
+    # one field on an already scanned page; element lookups parse their element each round
+    page = load_page(chain)
+    index = PageIndex(page)
+    index.variables
+    kind, name = field
+
+    def extract():
+        index._subtrees.clear() # elements are cached on the index after the first lookup
+        if kind == "row":
+            return index.table_row_value("walletResults1", name)
+        if kind == "elem":
+            return index.element_content(name)
+        return index.value(name)
+
+    assert extract() is not None
+    benchmark(extract)
+
+@mark.parametrize("chain", [Chain.ERA, Chain.STARKNET, Chain.SYBIL], ids=lambda chain: chain.name)
+def test_sweep(benchmark, loop, fixture_server, chain):
+    # fetch + parse through the local stand-in server, 200 wallets per round
+    wallets = [f"0x{i:040x}" for i in range(200)]
+
+    async def sweep():
+        async with ZkSession(base_url=fixture_server.url) as session:
+            return [r async for r in get_wallets_many(wallets, [chain], "", concurrency=20, session=session)]
+
+    results = benchmark.pedantic(lambda: loop.run_until_complete(sweep()), rounds=3)
+    assert all(r.error is None for r in results)
+    if benchmark.stats: # None under --benchmark-disable
+        benchmark.extra_info["wallets_per_sec"] = len(wallets) / benchmark.stats.stats.mean
@@ -0,0 +1,9 @@
+from pytest import fixture
+
+from tests.fixture_server import FixtureServer
+
+
+@fixture(scope="session")
+def fixture_server():
+    with FixtureServer() as server:
+        yield server
@@ -0,0 +1,65 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from zkparser.parser import Chain
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# url path of each results page -> its page in FIXTURES
+CHAIN_PAGES = {
+        "/results": (Chain.ERA, "era.html"),
+        "/layerzeroresults": (Chain.ZERO, "zero.html"),
+        "/starknetresults": (Chain.STARKNET, "starknet.html"),
+        "/scrollresults": (Chain.SCROLL, "scroll.html"),
+        "/linearesults": (Chain.LINEA, "linea.html"),
+        "/sybilcheckresults": (Chain.SYBIL, "sybil.html"),
+        }
+
+
+class FixtureServer:
+    """Local stand-in for 10kdrop serving the pages in FIXTURES, whatever the wallet.
+
+    Use as a context manager and point a session at it:
+    `ZkSession(base_url=server.url)`.
+    """
+
+    def __init__(self):
+        self.pages = {path: (FIXTURES / name).read_bytes() for path, (_, name) in CHAIN_PAGES.items()}
+        self.requests: list[str] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                page = server.pages.get(urlsplit(self.path).path)
+                self.send_response(200 if page is not None else 404)
+                body = page if page is not None else b"not found"
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FixtureServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
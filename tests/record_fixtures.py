@@ -0,0 +1,29 @@
+"""Re-record the page corpus in tests/fixtures from the live site.
+
+    python -m tests.record_fixtures WALLET PRO_CODE [STARKNET_WALLET]
+
+Pages are saved byte for byte as served; the offline tests and benchmarks
+assert values of the corpus, so update them along with a re-recording.
+"""
+import asyncio
+import sys
+
+from tests.fixture_server import CHAIN_PAGES, FIXTURES
+from zkparser.parser import Chain, gen_url
+from zkparser.session import ZkSession
+
+
+async def record(wallet: str, pro_code: str, starknet_wallet: str):
+    async with ZkSession() as session:
+        for chain, name in CHAIN_PAGES.values():
+            chain_wallet = starknet_wallet if chain == Chain.STARKNET else wallet
+            r = await session.retry_policy(chain).call(lambda: session.get(gen_url(chain_wallet, pro_code, chain)))
+            r.raise_for_status()
+            (FIXTURES / name).write_bytes(r.content)
+            print(f"{name}: {len(r.content)} bytes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit(__doc__)
+    asyncio.run(record(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else sys.argv[1]))
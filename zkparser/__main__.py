@@ -1 +1,229 @@
-from zk import *
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, TextIO
+
+from zkparser.bulk import CHAIN_LOOKUPS, CHAIN_MODELS, WalletResult, get_wallets_many
+from zkparser.columnar import ColumnarCollector
+from zkparser.journal import SweepJournal
+from zkparser.refresh import RefreshStore
+from zkparser.parser import Chain
+from zkparser.session import ZkSession
+
+
+def parse_chains(value: str) -> list[Chain]:
+    try:
+        chains = [Chain[name.strip().upper()] for name in value.split(",") if name.strip()]
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(f"unknown chain {e.args[0]}")
+    for chain in chains:
+        if chain not in CHAIN_LOOKUPS:
+            raise argparse.ArgumentTypeError(f"chain {chain.name} has no parser")
+
+    return chains
+
+def parse_shard(value: str) -> tuple[int, int]:
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must look like INDEX/COUNT")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard index must be in [0, COUNT)")
+
+    return index, count
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+            prog="python -m zkparser",
+            description="Look up wallets on 10kdrop and stream the results to stdout.",
+            )
+    parser.add_argument("input", nargs="?", default="-", help="file with one wallet per line, - for stdin (default)")
+    parser.add_argument("--pro-code", required=True)
+    parser.add_argument(
+            "--chains",
+            type=parse_chains,
+            default=list(CHAIN_LOOKUPS),
+            help="comma separated chains, default: " + ",".join(chain.name.lower() for chain in CHAIN_LOOKUPS),
+            )
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rate-limit", type=float, default=None, help="lookups started per second per host")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=0, help="parse pages in this many worker processes, 0 parses in the event loop")
+    parser.add_argument("--era-batch", action="store_true", help="experimental: fetch ERA pages four wallets at a time; the multi-wallet page layout is guessed and checked per page")
+    parser.add_argument("--http2", action="store_true", help="needs the http2 extra")
+    parser.add_argument("--journal", help="resume from and record progress to this journal file")
+    parser.add_argument("--refresh", metavar="STORE", help="only output wallets whose results changed since the last run with this store")
+    parser.add_argument("--shard", type=parse_shard, help="only sweep wallets of shard INDEX/COUNT, e.g. 0/4")
+    parser.add_argument("--columnar", metavar="DIR", help="also collect the results as columns into DIR")
+    parser.add_argument("--columnar-format", choices=["parquet", "npz"], default="parquet", help="parquet needs pyarrow, npz numpy")
+    parser.add_argument("--verbose", action="store_true", help="log every request to stderr")
+    parser.add_argument("--progress", type=float, default=5, help="seconds between progress lines on stderr, 0 to disable")
+
+    return parser.parse_args(argv)
+
+def read_wallets(stream: Iterable[str]) -> Iterator[str]:
+    for line in stream:
+        wallet = line.strip()
+        if wallet and not wallet.startswith("#"):
+            yield wallet
+
+async def read_wallets_async(stream: TextIO | BinaryIO, chunk_size: int = 64 * 1024) -> AsyncIterator[str]:
+    # a daemon thread hands over whatever the pipe already holds, so a slow
+    # upstream process never blocks the event loop, and a read still waiting
+    # for input doesn't hold up exiting
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue[bytes | Exception] = asyncio.Queue(maxsize=4)
+    binary = getattr(stream, "buffer", stream)
+
+    def read():
+        while True:
+            try:
+                chunk = binary.read1(chunk_size)
+            except Exception as e:
+                chunk = e
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+            if not chunk or isinstance(chunk, Exception):
+                return
+
+    threading.Thread(target=read, name="read-wallets", daemon=True).start()
+    rest = b""
+    while chunk := await chunks.get():
+        if isinstance(chunk, Exception):
+            raise chunk
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for wallet in read_wallets(line.decode() for line in lines):
+            yield wallet
+    for wallet in read_wallets([rest.decode()]):
+        yield wallet
+
+
+def result_fields(result: WalletResult) -> dict | None:
+    if result.result is None:
+        return None
+    return result.result.model_dump(mode="json", exclude={"wallet", "page"})
+
+class NdjsonWriter:
+    def __init__(self, stream: TextIO, chains: list[Chain]):
+        self.stream = stream
+
+    def write(self, result: WalletResult):
+        record = {
+                "wallet": result.wallet,
+                "chain": result.chain.value,
+                "error": result.error,
+                "result": result_fields(result),
+                }
+        self.stream.write(json.dumps(record) + "\n")
+
+class CsvWriter:
+    def __init__(self, stream: TextIO, chains: list[Chain]):
+        columns = ["wallet", "chain", "error"]
+        for chain in chains:
+            for name in CHAIN_MODELS[chain].model_fields:
+                if name not in columns and name != "page":
+                    columns.append(name)
+        self.writer = csv.DictWriter(stream, columns)
+        self.writer.writeheader()
+
+    def write(self, result: WalletResult):
+        row = {"wallet": result.wallet, "chain": result.chain.value, "error": result.error}
+        for name, value in (result_fields(result) or {}).items():
+            row[name] = json.dumps(value) if isinstance(value, (list, dict)) else value
+        self.writer.writerow(row)
+
+
+class Progress:
+    def __init__(self, stream: TextIO, interval: float):
+        self.stream = stream
+        self.interval = interval
+        self.started = self.reported = time.monotonic()
+        self.done = self.empty = self.failed = 0
+
+    def update(self, result: WalletResult):
+        self.done += 1
+        if result.error is not None:
+            self.failed += 1
+        elif result.result is None:
+            self.empty += 1
+        if self.interval and time.monotonic() - self.reported >= self.interval:
+            self.report()
+
+    def report(self):
+        self.reported = time.monotonic()
+        elapsed = self.reported - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        self.stream.write(
+                f"{self.done} lookups ({self.failed} failed, {self.empty} without data) "
+                f"in {elapsed:.1f}s, {rate:.1f}/s\n"
+                )
+        self.stream.flush()
+
+
+async def sweep(args: argparse.Namespace, wallets: AsyncIterator[str], out: TextIO):
+    writer = (CsvWriter if args.format == "csv" else NdjsonWriter)(out, args.chains)
+    progress = Progress(sys.stderr, args.progress)
+    journal = SweepJournal(args.journal) if args.journal else None
+    collector = ColumnarCollector(args.columnar, format=args.columnar_format) if args.columnar else None
+    executor = ProcessPoolExecutor(args.processes) if args.processes else None
+    refresh = RefreshStore(args.refresh) if args.refresh else None
+    async with ZkSession(max_connections=args.max_connections, http2=args.http2) as session:
+        results = get_wallets_many(
+                wallets,
+                args.chains,
+                args.pro_code,
+                concurrency=args.concurrency,
+                rate_limit=args.rate_limit,
+                session=session,
+                journal=journal,
+                shard=args.shard,
+                bulk=True,
+                executor=executor,
+                era_batch=args.era_batch,
+                refresh=refresh,
+                )
+        try:
+            async for result in results:
+                writer.write(result)
+                if collector:
+                    collector.add(result)
+                progress.update(result)
+        finally:
+            await results.aclose()
+            if journal:
+                journal.close()
+            if collector:
+                collector.close()
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if refresh:
+                refresh.close()
+    progress.report()
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    out = sys.stdout
+    # stdout carries results only
+    logging.basicConfig(
+            stream=sys.stderr,
+            level=logging.INFO if args.verbose else logging.WARNING,
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+            )
+    with contextlib.ExitStack() as stack:
+        stream = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, "rb"))
+        try:
+            asyncio.run(sweep(args, read_wallets_async(stream), out))
+        except KeyboardInterrupt:
+            sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
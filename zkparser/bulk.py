@@ -0,0 +1,206 @@
+import asyncio
+import inspect
+from concurrent.futures import Executor
+from typing import Any, AsyncIterable, AsyncIterator, Iterable
+import httpx
+from pydantic import BaseModel
+
+from zkparser.journal import JobStatus, SweepJournal, shard_of
+from zkparser.parser import Chain, WrongChainException, gen_url, get_page_content
+from zkparser.refresh import PageState, RefreshStore
+from zkparser.scheduler import Priority, priority
+from zkparser.session import ZkSession, get_default_session
+from zkparser.utils import RateLimiter
+from zkparser.zk import (
+        ERA_BATCH_SIZE,
+        WalletEra,
+        WalletZero,
+        WalletStarknet,
+        WalletScroll,
+        WalletLinea,
+        WalletSybil,
+        get_wallet_era,
+        get_wallet_zero,
+        get_wallet_starknet,
+        get_wallet_scroll,
+        get_wallet_linea_mainnet,
+        get_wallet_sybil,
+        get_wallets_era_full,
+        parse_page,
+                    )
+
+
+CHAIN_LOOKUPS = {
+        Chain.ERA: get_wallet_era,
+        Chain.ZERO: get_wallet_zero,
+        Chain.STARKNET: get_wallet_starknet,
+        Chain.SCROLL: get_wallet_scroll,
+        Chain.LINEA: get_wallet_linea_mainnet,
+        Chain.SYBIL: get_wallet_sybil,
+        }
+
+CHAIN_MODELS = {
+        Chain.ERA: WalletEra,
+        Chain.ZERO: WalletZero,
+        Chain.STARKNET: WalletStarknet,
+        Chain.SCROLL: WalletScroll,
+        Chain.LINEA: WalletLinea,
+        Chain.SYBIL: WalletSybil,
+        }
+
+
+class WalletResult(BaseModel):
+    wallet: str
+    chain: Chain
+    result: Any = None # None when the page has no data for the wallet
+    error: str | None = None
+    changed: bool | None = None # refresh mode: whether the parsed fields changed
+
+
+async def _iter_wallets(wallets: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[str]:
+    if isinstance(wallets, AsyncIterable):
+        async for wallet in wallets:
+            yield wallet
+    else:
+        for wallet in wallets:
+            yield wallet
+
+async def get_wallets_many(
+        wallets: Iterable[str] | AsyncIterable[str],
+        chains: Iterable[Chain],
+        pro_code: str,
+        concurrency: int = 10,
+        rate_limit: float | None = None,
+        session: ZkSession | None = None,
+        journal: SweepJournal | None = None,
+        shard: tuple[int, int] | None = None,
+        bulk: bool = False,
+        keep_page: bool | None = None,
+        executor: Executor | None = None,
+        era_batch: bool = False,
+        refresh: RefreshStore | None = None,
+        ) -> AsyncIterator[WalletResult]:
+    """Look up every wallet on every chain, yielding results as they complete.
+
+    At most `concurrency` lookups run at once and wallets are pulled from the
+    iterable only as workers free up, so memory stays flat for huge inputs.
+    `rate_limit` caps lookups started per second against each host.
+    With a journal, pairs it has as done are skipped and every result is
+    recorded once the consumer has taken it. `shard=(index, count)` keeps only
+    the wallets of one shard, for splitting a sweep across machines.
+    `bulk` builds results without pydantic validation and, unless `keep_page`,
+    without the raw page, keeping each result down to its parsed fields;
+    without `bulk` the page is kept unless `keep_page` is False.
+    With an `executor` (e.g. a ProcessPoolExecutor) the workers only fetch and
+    hand each page to it for parsing, waiting for the result before fetching
+    the next one, so no more than `concurrency` pages are ever queued there.
+    Lookups then bypass the session's ModelCache.
+    `era_batch` (experimental, see get_wallets_era_full) fetches ERA pages four
+    wallets at a time, falling back to one wallet per page when a page doesn't
+    check out; those are parsed in the event loop even with an executor.
+    With a `refresh` store only results whose fields changed since the store's
+    last run are yielded, see RefreshStore; ERA pages are then fetched one
+    wallet at a time.
+    Fetches are made with BULK priority, for sessions with a FetchScheduler.
+    """
+    chains = list(chains)
+    for chain in chains:
+        if chain not in CHAIN_LOOKUPS: raise WrongChainException(chain)
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    jobs: asyncio.Queue[tuple[list[str], Chain] | None] = asyncio.Queue(maxsize=concurrency)
+    results: asyncio.Queue[WalletResult | None] = asyncio.Queue(maxsize=concurrency)
+    limiters: dict[str, RateLimiter] = {}
+    states: dict[tuple[str, Chain], PageState] = {}
+    era_batch = era_batch and refresh is None
+    loop = asyncio.get_running_loop()
+    lookup_options = {}
+    for chain in chains:
+        lookup_options[chain] = {"bulk": bulk}
+        if "keep_page" in inspect.signature(CHAIN_LOOKUPS[chain]).parameters:
+            lookup_options[chain]["keep_page"] = keep_page
+
+    async def stop_workers():
+        for _ in range(concurrency):
+            await jobs.put(None)
+
+    async def produce():
+        era_wallets = []
+        try:
+            async for wallet in _iter_wallets(wallets):
+                if shard and shard_of(wallet, shard[1]) != shard[0]:
+                    continue
+                for chain in chains:
+                    if journal and journal.is_done(wallet, chain):
+                        continue
+                    if era_batch and chain == Chain.ERA:
+                        era_wallets.append(wallet)
+                        if len(era_wallets) == ERA_BATCH_SIZE:
+                            await jobs.put((era_wallets, chain))
+                            era_wallets = []
+                        continue
+                    await jobs.put(([wallet], chain))
+            if era_wallets:
+                await jobs.put((era_wallets, Chain.ERA))
+        except Exception:
+            # let the workers drain, the error is re-raised by awaiting this task
+            await stop_workers()
+            raise
+        await stop_workers()
+
+    async def lookup(wallets: list[str], chain: Chain) -> list[WalletResult]:
+        if rate_limit:
+            host = httpx.URL(gen_url(wallets[0], pro_code, chain, (session or get_default_session()).base_url)).host
+            if host not in limiters:
+                limiters[host] = RateLimiter(rate_limit)
+            await limiters[host].acquire()
+        if era_batch and chain == Chain.ERA:
+            try:
+                fulls = await get_wallets_era_full(wallets, pro_code, session, bulk, keep_page)
+            except Exception as e:
+                return [WalletResult(wallet=wallet, chain=chain, error=repr(e)) for wallet in wallets]
+            return [WalletResult(wallet=wallet, chain=chain, result=full[0] if full else None) for wallet, full in zip(wallets, fulls)]
+
+        wallet, = wallets
+        try:
+            if refresh:
+                changed, result, states[(wallet, chain)] = await refresh.check(wallet, pro_code, chain, session, bulk, keep_page, executor)
+                return [WalletResult(wallet=wallet, chain=chain, result=result, changed=changed)]
+            if executor:
+                page = await get_page_content(wallet, pro_code, chain, session)
+                result = await loop.run_in_executor(executor, parse_page, chain, wallet, page, bulk, keep_page)
+            else:
+                result = await CHAIN_LOOKUPS[chain](wallet, pro_code, session=session, **lookup_options[chain])
+        except Exception as e:
+            return [WalletResult(wallet=wallet, chain=chain, error=repr(e))]
+
+        return [WalletResult(wallet=wallet, chain=chain, result=result)]
+
+    async def work():
+        with priority(Priority.BULK):
+            while (job := await jobs.get()) is not None:
+                for result in await lookup(*job):
+                    await results.put(result)
+        await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        running = concurrency
+        while running:
+            result = await results.get()
+            if result is None:
+                running -= 1
+                continue
+            if result.changed is not False:
+                yield result
+            if refresh and (result.wallet, result.chain) in states:
+                refresh.save(states.pop((result.wallet, result.chain)))
+            if journal:
+                status = JobStatus.FAILED if result.error is not None else JobStatus.DONE
+                journal.record(result.wallet, result.chain, status, result.error)
+        await producer
+    finally:
+        for task in (producer, *workers):
+            task.cancel()
@@ -0,0 +1,207 @@
+import asyncio
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Hashable
+
+from zkparser.scheduler import Claim, _within, current_claim, run_claimed
+
+if TYPE_CHECKING:
+    from zkparser.parser import Chain
+
+
+class CacheMissException(Exception):
+    pass
+
+
+class PageCache:
+    """Raw pages on disk in SQLite, zlib-compressed, keyed by (wallet, chain, pro_code).
+
+    Entries expire after `ttl` seconds (per chain overrides in `ttls`, None keeps
+    them forever). When the stored pages exceed `max_bytes` the least recently
+    used ones are evicted. With `cache_only` nothing is downloaded: misses raise
+    CacheMissException and expired pages are still served.
+    """
+
+    def __init__(
+            self,
+            path: str | Path,
+            ttl: float | None = 24 * 60 * 60,
+            ttls: "dict[Chain, float | None] | None" = None,
+            max_bytes: int | None = 1024 ** 3,
+            cache_only: bool = False,
+            ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.ttls = {chain.value: chain_ttl for chain, chain_ttl in (ttls or {}).items()}
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                wallet TEXT NOT NULL,
+                chain TEXT NOT NULL,
+                pro_code TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (wallet, chain, pro_code)
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        # running total so writes don't sum the table; recounted before evicting
+        self._size = self.size()
+
+    def _ttl(self, chain: "Chain") -> float | None:
+        return self.ttls.get(chain.value, self.ttl)
+
+    def get(self, wallet: str, pro_code: str, chain: "Chain") -> bytes | None:
+        key = (wallet, chain.value, pro_code)
+        row = self.db.execute(
+                "SELECT content, size, stored_at FROM pages WHERE wallet = ? AND chain = ? AND pro_code = ?",
+                key,
+                ).fetchone()
+        if row is None:
+            return None
+
+        content, size, stored_at = row
+        ttl = self._ttl(chain)
+        now = time.time()
+        if ttl is not None and now - stored_at > ttl and not self.cache_only:
+            self.db.execute("DELETE FROM pages WHERE wallet = ? AND chain = ? AND pro_code = ?", key)
+            self._size -= size
+            return None
+        self.db.execute(
+                "UPDATE pages SET accessed_at = ? WHERE wallet = ? AND chain = ? AND pro_code = ?",
+                (now, *key),
+                )
+
+        return zlib.decompress(content)
+
+    def set(self, wallet: str, pro_code: str, chain: "Chain", page: bytes):
+        key = (wallet, chain.value, pro_code)
+        content = zlib.compress(page)
+        now = time.time()
+        replaced = self.db.execute(
+                "SELECT size FROM pages WHERE wallet = ? AND chain = ? AND pro_code = ?",
+                key,
+                ).fetchone()
+        self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, content, len(content), now, now),
+                )
+        self._size += len(content) - (replaced[0] if replaced else 0)
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self._evict(self.max_bytes)
+
+    def _evict(self, max_bytes: int):
+        size = self.size()
+        if size <= max_bytes:
+            self._size = size
+            return
+
+        rows = self.db.execute("SELECT rowid, size FROM pages ORDER BY accessed_at")
+        evicted = []
+        for rowid, row_size in rows:
+            if size <= max_bytes:
+                break
+            evicted.append((rowid,))
+            size -= row_size
+        self.db.executemany("DELETE FROM pages WHERE rowid = ?", evicted)
+        self._size = size
+
+    def size(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def clear(self):
+        self.db.execute("DELETE FROM pages")
+        self._size = 0
+
+    def close(self):
+        self.db.close()
+
+
+class ModelCache:
+    """In-memory LRU of lookup results, each kept for at most `ttl` seconds.
+
+    Behaves like a dict: missing or expired keys raise KeyError.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float | None = 5 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        stored_at, value = self._items[key]
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._items[key]
+            raise KeyError(key)
+        self._items.move_to_end(key)
+
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
+
+
+@dataclass(eq=False)
+class _Call:
+    task: asyncio.Task
+    claim: Claim
+    callers: int = 0 # callers still waiting for it
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result.
+
+    The call's fetches run under a scheduler Claim shared by its callers, so
+    one joining with a higher priority or later deadline raises it for the
+    scheduling. Each caller still waits only until its own deadline, and the
+    call is cancelled once every caller has given up on it.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        caller = current_claim()
+        call = self._calls.get(key)
+        if call is None or call.task.get_loop() is not asyncio.get_running_loop():
+            claim = caller.follow()
+            call = _Call(asyncio.ensure_future(run_claimed(claim, func)), claim)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, task))
+        else:
+            call.claim.join(caller)
+
+        call.callers += 1
+        try:
+            return await _within(caller, call.task, f"{key!r} still running at the caller's deadline")
+        finally:
+            call.callers -= 1
+            if not call.callers and not call.task.done():
+                # nobody wants the result any more; later callers start afresh
+                self._forget(key, call.task)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
@@ -0,0 +1,230 @@
+import types
+import typing
+from array import array
+from pathlib import Path
+from typing import Any, Iterable, Literal
+
+from pydantic import BaseModel
+
+
+# column kinds and how each is held while accumulating
+INT = "int"
+FLOAT = "float" # None is stored as NaN
+BOOL = "bool"
+STR = "str" # None is stored as ""
+INT_LIST = "int_list" # flat values plus row offsets
+INT_PAIR = "int_pair" # split into NAME_low / NAME_high
+
+
+def column_kind(annotation: Any) -> str:
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [arg for arg in args if arg is not type(None)]
+        if len(args) == 1:
+            return column_kind(args[0])
+        return STR
+    if annotation is bool:
+        return BOOL
+    if annotation is int:
+        return INT
+    if annotation is float:
+        return FLOAT
+    if annotation is str or typing.get_origin(annotation) is Literal:
+        return STR
+    if typing.get_origin(annotation) is list and args == (int,):
+        return INT_LIST
+    if typing.get_origin(annotation) is tuple and args == (int, int):
+        return INT_PAIR
+
+    raise TypeError(f"no column type for {annotation}")
+
+
+class Columns:
+    """Typed columns of one model type, filled row by row."""
+
+    def __init__(self, model: type[BaseModel], exclude: Iterable[str] = ("page",)):
+        self.model = model
+        self.kinds = {
+                name: column_kind(field.annotation)
+                for name, field in model.model_fields.items() if name not in exclude
+                }
+        self.clear()
+
+    def clear(self):
+        self.rows = 0
+        self.data: dict[str, Any] = {}
+        for name, kind in self.kinds.items():
+            if kind == INT:
+                self.data[name] = array("q")
+            elif kind == FLOAT:
+                self.data[name] = array("d")
+            elif kind == BOOL:
+                self.data[name] = array("b")
+            elif kind == STR:
+                self.data[name] = []
+            elif kind == INT_LIST:
+                self.data[name] = array("q")
+                self.data[f"{name}_offsets"] = array("q", [0])
+            elif kind == INT_PAIR:
+                self.data[f"{name}_low"] = array("q")
+                self.data[f"{name}_high"] = array("q")
+
+    def append(self, item: BaseModel):
+        for name, kind in self.kinds.items():
+            value = getattr(item, name)
+            if kind == FLOAT:
+                self.data[name].append(float("nan") if value is None else value)
+            elif kind == STR:
+                self.data[name].append("" if value is None else str(value))
+            elif kind == INT_LIST:
+                self.data[name].extend(value)
+                self.data[f"{name}_offsets"].append(len(self.data[name]))
+            elif kind == INT_PAIR:
+                low, high = value or (0, 0)
+                self.data[f"{name}_low"].append(low)
+                self.data[f"{name}_high"].append(high)
+            else:
+                self.data[name].append(value)
+        self.rows += 1
+
+    def to_numpy(self) -> dict[str, Any]:
+        import numpy
+
+        arrays = {}
+        for name, column in self.data.items():
+            if isinstance(column, list):
+                arrays[name] = numpy.array(column, dtype=str)
+            elif column.typecode == "b":
+                arrays[name] = numpy.frombuffer(column, dtype=numpy.int8).astype(bool)
+            else:
+                arrays[name] = numpy.frombuffer(column, dtype=numpy.int64 if column.typecode == "q" else numpy.float64).copy()
+
+        return arrays
+
+    def to_arrow(self):
+        import pyarrow
+
+        arrays = {}
+        for name, kind in self.kinds.items():
+            if kind == INT:
+                arrays[name] = pyarrow.array(self.data[name], pyarrow.int64())
+            elif kind == FLOAT:
+                arrays[name] = pyarrow.array(self.data[name], pyarrow.float64(), from_pandas=True) # NaN -> null
+            elif kind == BOOL:
+                arrays[name] = pyarrow.array([bool(value) for value in self.data[name]], pyarrow.bool_())
+            elif kind == STR:
+                arrays[name] = pyarrow.array(self.data[name], pyarrow.string())
+            elif kind == INT_LIST:
+                arrays[name] = pyarrow.ListArray.from_arrays(
+                        pyarrow.array(self.data[f"{name}_offsets"], pyarrow.int32()),
+                        pyarrow.array(self.data[name], pyarrow.int64()),
+                        )
+            elif kind == INT_PAIR:
+                for part in ("low", "high"):
+                    arrays[f"{name}_{part}"] = pyarrow.array(self.data[f"{name}_{part}"], pyarrow.int64())
+
+        return pyarrow.table(arrays)
+
+
+class ColumnarCollector:
+    """Collects sweep results into per-model columns, written out every `chunk_size` rows.
+
+    format "parquet" appends row groups to DIRECTORY/<Model>.parquet (needs pyarrow);
+    format "npz" writes DIRECTORY/<Model>-<chunk>.npz files (needs numpy), where
+    list columns come as NAME (flat values) plus NAME_offsets.
+    Use as a context manager or call close() to write the last partial chunk.
+    """
+
+    def __init__(self, directory: str | Path, format: Literal["parquet", "npz"] = "parquet", chunk_size: int = 100_000):
+        if format not in ("parquet", "npz"):
+            raise ValueError(f"unknown format {format}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.chunk_size = chunk_size
+        self.columns: dict[type[BaseModel], Columns] = {}
+        self.chunks: dict[type[BaseModel], int] = {}
+        self._writers: dict[type[BaseModel], Any] = {}
+
+    def add(self, item: Any):
+        # takes models, tuples of models (e.g. get_wallet_era_full) and WalletResult;
+        # rows of one model are told apart only by their fields, as WalletLinea's
+        # `network` does for the two rows of get_wallet_linea
+        if item is None:
+            return
+        if isinstance(item, tuple):
+            for part in item:
+                self.add(part)
+            return
+        if not isinstance(item, BaseModel):
+            raise TypeError(f"cannot collect {type(item).__name__}")
+        if "result" in type(item).model_fields and "chain" in type(item).model_fields:
+            self.add(item.result)
+            return
+
+        model = type(item)
+        if model not in self.columns:
+            self.columns[model] = Columns(model)
+            self.chunks[model] = 0
+        columns = self.columns[model]
+        columns.append(item)
+        if columns.rows >= self.chunk_size:
+            self._write(model)
+
+    def _write(self, model: type[BaseModel]):
+        columns = self.columns[model]
+        if not columns.rows:
+            return
+
+        if self.format == "npz":
+            import numpy
+            numpy.savez(self.directory / f"{model.__name__}-{self.chunks[model]:05d}.npz", **columns.to_numpy())
+        else:
+            import pyarrow.parquet
+
+            table = columns.to_arrow()
+            if model not in self._writers:
+                self._writers[model] = pyarrow.parquet.ParquetWriter(self.directory / f"{model.__name__}.parquet", table.schema)
+            self._writers[model].write_table(table)
+        self.chunks[model] += 1
+        columns.clear()
+
+    def flush(self):
+        for model in self.columns:
+            self._write(model)
+
+    def close(self):
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def __enter__(self) -> "ColumnarCollector":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_npz(directory: str | Path, model: type[BaseModel] | str) -> dict[str, Any]:
+    # concatenates every chunk of one model written by a ColumnarCollector
+    import numpy
+
+    name = model if isinstance(model, str) else model.__name__
+    chunks = [dict(numpy.load(path)) for path in sorted(Path(directory).glob(f"{name}-*.npz"))]
+    if not chunks:
+        return {}
+
+    merged = {}
+    for column in chunks[0]:
+        if column.endswith("_offsets"):
+            # shift each chunk's offsets past the values of the chunks before it
+            parts, shift = [chunks[0][column][:1]], 0
+            for chunk in chunks:
+                parts.append(chunk[column][1:] + shift)
+                shift += chunk[column][-1]
+            merged[column] = numpy.concatenate(parts)
+        else:
+            merged[column] = numpy.concatenate([chunk[column] for chunk in chunks])
+
+    return merged
@@ -0,0 +1,159 @@
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+
+
+VOID_ELEMENTS = {
+        "area", "base", "br", "col", "embed", "hr", "img", "input",
+        "link", "meta", "param", "source", "track", "wbr",
+        }
+
+
+@dataclass
+class Element:
+    tag: str
+    parent: int | None # index of the enclosing element in the scanned list
+    inner_start: int
+    inner_end: int | None = None # None while (or if never) closed
+
+
+class _Done(Exception):
+    pass
+
+
+class _SubtreeScanner(HTMLParser):
+    # feeds from the first tag of the data and stops as soon as that tag closes
+
+    def __init__(self, data: str):
+        super().__init__(convert_charrefs=False)
+        self.data = data
+        self.elements: list[Element] = []
+        self.stack: list[int] = []
+        self._line_starts: list[int] | None = None
+
+    def _offset(self) -> int:
+        lineno, column = self.getpos()
+        if lineno == 1:
+            return column
+        if self._line_starts is None:
+            self._line_starts = [0] + [m.end() for m in re.finditer("\n", self.data)]
+
+        return self._line_starts[lineno - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset() + len(self.get_starttag_text())
+        parent = self.stack[-1] if self.stack else None
+        if tag in VOID_ELEMENTS:
+            self.elements.append(Element(tag, parent, start, start))
+            if not self.stack:
+                raise _Done
+            return
+        self.elements.append(Element(tag, parent, start))
+        self.stack.append(len(self.elements) - 1)
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset() + len(self.get_starttag_text())
+        parent = self.stack[-1] if self.stack else None
+        self.elements.append(Element(tag, parent, start, start))
+        if not self.stack:
+            raise _Done
+
+    def handle_endtag(self, tag):
+        # like html.parser based trees, an end tag closes everything opened
+        # after the matching start tag; one matching nothing we opened must
+        # belong to an enclosing element, which closes the whole subtree
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.elements[self.stack[depth]].tag == tag:
+                break
+        else:
+            depth = 0
+        end = self._offset()
+        for index in self.stack[depth:]:
+            self.elements[index].inner_end = end
+        del self.stack[depth:]
+        if not self.stack:
+            raise _Done
+
+    def scan(self, complete: bool = True) -> list[Element] | None:
+        # None when the data ends before the element closes and isn't complete
+        try:
+            self.feed(self.data)
+            if not complete:
+                return None
+            self.close()
+        except _Done:
+            pass
+        # unclosed elements run to the end of the data
+        for index in self.stack:
+            self.elements[index].inner_end = len(self.data)
+
+        return self.elements
+
+
+class ElementSubtree:
+    """The element with a given id and everything inside it, parsed on its own.
+
+    Only the slice of the page from the element's start tag to its end tag is
+    run through html.parser, instead of building a tree of the whole page. The
+    slice is taken (and, from a bytes page, decoded) in growing windows, so a
+    small element doesn't copy the rest of a large page.
+    """
+
+    WINDOW = 8 * 1024
+
+    def __init__(self, content: str | bytes, start: int):
+        size = self.WINDOW
+        while True:
+            complete = start + size >= len(content)
+            window = content[start:start + size]
+            # a character cut at the window's end is only read if the element
+            # runs past it, and then the scan is redone with a larger window
+            self.text = window.decode(errors="replace") if isinstance(window, bytes) else window
+            elements = _SubtreeScanner(self.text).scan(complete)
+            if elements is not None:
+                break
+            size *= 4
+        self.elements = elements
+
+    def inner_html(self, index: int = 0) -> str:
+        element = self.elements[index]
+        return self.text[element.inner_start:element.inner_end]
+
+    def find_all(self, tag: str, within: int = 0) -> list[int]:
+        return [
+                index for index, element in enumerate(self.elements)
+                if element.tag == tag and index != within and self._is_inside(index, within)
+                ]
+
+    def _is_inside(self, index: int, ancestor: int) -> bool:
+        parent = self.elements[index].parent
+        while parent is not None:
+            if parent == ancestor:
+                return True
+            parent = self.elements[parent].parent
+
+        return False
+
+def find_element_start(content: str | bytes, elem_id: str) -> int | None:
+    id_value = re.escape(elem_id)
+    pattern = f"<[a-zA-Z][^\\s/>]*\\s(?:[^>]*?\\s)?id\\s*=\\s*(?:\"{id_value}\"|'{id_value}'|{id_value}(?=[\\s/>]))"
+    needle, tag_open = elem_id, "<"
+    if isinstance(content, bytes):
+        pattern, needle, tag_open = pattern.encode(), needle.encode(), b"<"
+    start_tag = re.compile(pattern)
+    # jump between literal occurrences of the id instead of trying the
+    # pattern at every tag of the page
+    position = content.find(needle)
+    while position != -1:
+        tag_start = content.rfind(tag_open, 0, position)
+        if tag_start != -1 and start_tag.match(content, tag_start):
+            return tag_start
+        position = content.find(needle, position + 1)
+
+    return None
+
+def get_element_subtree(content: str | bytes, elem_id: str) -> ElementSubtree | None:
+    start = find_element_start(content, elem_id)
+    if start is None: return None
+
+    return ElementSubtree(content, start)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sys
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Iterable
+
+from zkparser.parser import Chain
+
+
+class JobStatus(Enum):
+    PENDING = "pending" # never recorded
+    DONE = "done"
+    FAILED = "failed"
+
+
+def shard_of(wallet: str, shards: int) -> int:
+    # stable across runs and machines, unlike hash()
+    digest = hashlib.sha1(wallet.lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+class SweepJournal:
+    """Append-only NDJSON record of finished (wallet, chain) lookups.
+
+    Reopening a journal replays it, so a rerun can skip DONE pairs and retry
+    the FAILED ones. The last record of a pair wins.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.statuses: dict[tuple[str, str], JobStatus] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for record in _read_records(f):
+                    self.statuses[(record["wallet"], record["chain"])] = JobStatus(record["status"])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+        if self._file.tell() and not self.path.read_bytes().endswith(b"\n"):
+            self._file.write("\n") # don't glue onto a line cut short by a crash
+
+    def status(self, wallet: str, chain: Chain) -> JobStatus:
+        return self.statuses.get((wallet, chain.value), JobStatus.PENDING)
+
+    def is_done(self, wallet: str, chain: Chain) -> bool:
+        return self.status(wallet, chain) == JobStatus.DONE
+
+    def record(self, wallet: str, chain: Chain, status: JobStatus, error: str | None = None):
+        self.statuses[(wallet, chain.value)] = status
+        record = {"wallet": wallet, "chain": chain.value, "status": status.value, "time": time.time()}
+        if error is not None:
+            record["error"] = error
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def counts(self) -> dict[JobStatus, int]:
+        counts = {status: 0 for status in (JobStatus.DONE, JobStatus.FAILED)}
+        for status in self.statuses.values():
+            counts[status] += 1
+
+        return counts
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "SweepJournal":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_records(lines: Iterable[str]) -> Iterable[dict]:
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue # a line cut short by a crash
+
+def _precedence(record: dict) -> tuple[bool, float]:
+    return record["status"] == JobStatus.DONE.value, record.get("time", 0)
+
+def merge_journals(paths: Iterable[str | Path], out: str | Path):
+    """Merge journals of sharded runs into one compacted journal.
+
+    A pair done by any journal counts as done; otherwise its latest record wins.
+    """
+    merged: dict[tuple[str, str], dict] = {}
+    for path in paths:
+        with open(path) as f:
+            for record in _read_records(f):
+                key = (record["wallet"], record["chain"])
+                if key not in merged or _precedence(record) > _precedence(merged[key]):
+                    merged[key] = record
+
+    with open(out, "w") as f:
+        for record in merged.values():
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m zkparser.journal OUT JOURNAL [JOURNAL ...]")
+    merge_journals(sys.argv[2:], sys.argv[1])
@@ -0,0 +1,94 @@
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from zkparser.parser import Chain
+
+
+class Observer:
+    """Receives hot-path timings; override the hooks you need.
+
+    on_fetch: download of one page (network only, cache hits are not reported)
+    on_extract: pulling the raw field values out of a page
+    on_validate: building the pydantic model from those values
+    """
+
+    def on_fetch(self, chain: "Chain", seconds: float, size: int):
+        pass
+
+    def on_extract(self, chain: "Chain", seconds: float):
+        pass
+
+    def on_validate(self, chain: "Chain", seconds: float):
+        pass
+
+
+observers: list[Observer] = []
+
+def add_observer(observer: Observer):
+    observers.append(observer)
+
+def remove_observer(observer: Observer):
+    observers.remove(observer)
+
+
+def fetched(chain: "Chain", seconds: float, size: int):
+    for observer in observers:
+        observer.on_fetch(chain, seconds, size)
+
+@contextmanager
+def timed(chain: "Chain", stage: str) -> Iterator[None]:
+    # stage is "extract" or "validate"; reported even when the block returns early
+    if not observers:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        for observer in observers:
+            getattr(observer, f"on_{stage}")(chain, seconds)
+
+
+class PrometheusObserver(Observer):
+    """Exports the timings as prometheus_client histograms labelled by chain.
+
+    Needs the optional `prometheus-client` package.
+    """
+
+    def __init__(self, namespace: str = "zkparser", registry=None):
+        try:
+            from prometheus_client import REGISTRY, Counter, Histogram
+        except ImportError as e:
+            raise ImportError("PrometheusObserver needs prometheus-client: pip install prometheus-client") from e
+
+        registry = registry or REGISTRY
+        self.fetches = Counter("fetches", "Pages downloaded", ["chain"], namespace=namespace, registry=registry)
+        self.fetch_seconds = Histogram(
+                "fetch_seconds", "Page download latency", ["chain"], namespace=namespace, registry=registry,
+                )
+        self.page_bytes = Histogram(
+                "page_bytes", "Downloaded page size", ["chain"], namespace=namespace, registry=registry,
+                buckets=[2 ** power for power in range(10, 23)],
+                )
+        self.extract_seconds = Histogram(
+                "extract_seconds", "Field extraction time per page", ["chain"], namespace=namespace, registry=registry,
+                buckets=[0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5],
+                )
+        self.validate_seconds = Histogram(
+                "validate_seconds", "Model validation time per page", ["chain"], namespace=namespace, registry=registry,
+                buckets=[0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01],
+                )
+
+    def on_fetch(self, chain: "Chain", seconds: float, size: int):
+        self.fetches.labels(chain.value).inc()
+        self.fetch_seconds.labels(chain.value).observe(seconds)
+        self.page_bytes.labels(chain.value).observe(size)
+
+    def on_extract(self, chain: "Chain", seconds: float):
+        self.extract_seconds.labels(chain.value).observe(seconds)
+
+    def on_validate(self, chain: "Chain", seconds: float):
+        self.validate_seconds.labels(chain.value).observe(seconds)
@@ -1,10 +1,17 @@
+import logging
 import re
+import time
+from functools import cached_property, lru_cache
 from enum import Enum
 import httpx
-from bs4 import BeautifulSoup
-from bs4.element import Tag
 
-from .utils import readtimeout_retry
+from . import metrics
+from .cache import CacheMissException
+from .elements import ElementSubtree, get_element_subtree
+from .session import BASE_URL, ZkSession, get_default_session
+
+
+logger = logging.getLogger("zkparser")
 
 
 class Chain(Enum):
@@ -20,14 +27,18 @@ class WrongChainException(Exception):
     pass
 
 
-def gen_url(wallet: str, pro_code: str, chain: Chain) -> str:
-    ERA = f"https://www.10kdrop.com/results?walletAddress={wallet}&walletAddress2=&walletAddress3=&walletAddress4=&proCode={pro_code}"
-    ZERO = f"https://www.10kdrop.com/layerzeroresults?walletAddress={wallet}&proCode={pro_code}"
-    STARKNET = f"https://www.10kdrop.com/starknetresults?walletAddress={wallet}&proCode={pro_code}"
-    SCROLL = f"https://www.10kdrop.com/scrollresults?walletAddress={wallet}&proCode={pro_code}"
-    LINEA = f"https://www.10kdrop.com/linearesults?walletAddress={wallet}&proCode={pro_code}"
-    POLYGON = f"https://www.10kdrop.com/polygonzkevmresults?walletAddress={wallet}&proCode={pro_code}"
-    SYBIL = f"https://www.10kdrop.com/sybilcheckresults?walletAddress={wallet}&proCode={pro_code}"
+def gen_url(wallet: str, pro_code: str, chain: Chain, base_url: str = BASE_URL, extra_wallets: tuple[str, ...] = ()) -> str:
+    # extra_wallets fill the ERA page's walletAddress2..4 slots
+    if len(extra_wallets) > 3 or (extra_wallets and chain != Chain.ERA):
+        raise ValueError("only ERA pages take up to 3 extra wallets")
+    w2, w3, w4 = (*extra_wallets, "", "", "")[:3]
+    ERA = f"{base_url}/results?walletAddress={wallet}&walletAddress2={w2}&walletAddress3={w3}&walletAddress4={w4}&proCode={pro_code}"
+    ZERO = f"{base_url}/layerzeroresults?walletAddress={wallet}&proCode={pro_code}"
+    STARKNET = f"{base_url}/starknetresults?walletAddress={wallet}&proCode={pro_code}"
+    SCROLL = f"{base_url}/scrollresults?walletAddress={wallet}&proCode={pro_code}"
+    LINEA = f"{base_url}/linearesults?walletAddress={wallet}&proCode={pro_code}"
+    POLYGON = f"{base_url}/polygonzkevmresults?walletAddress={wallet}&proCode={pro_code}"
+    SYBIL = f"{base_url}/sybilcheckresults?walletAddress={wallet}&proCode={pro_code}"
 
     if chain == Chain.ERA: url = ERA
     elif chain == Chain.ZERO: url = ZERO
@@ -40,55 +51,163 @@ def gen_url(wallet: str, pro_code: str, chain: Chain) -> str:
 
     return url
 
-@readtimeout_retry(5)
-async def get_page_content(wallet: str, pro_code: str, chain: Chain) -> str:
-    url = gen_url(wallet, pro_code, chain)
-    async with httpx.AsyncClient() as client:
-        print(f"making request to {url=}")
-        r = await client.get(url, timeout=20)
+async def fetch_page(url: str, chain: Chain, session: ZkSession, headers: dict[str, str] | None = None) -> httpx.Response:
+    # one logged, timed and retried download, bypassing the page cache
+    logger.info("making request to %s", url, extra={"chain": chain.value, "url": url})
+    started = time.perf_counter()
+    async def request() -> httpx.Response:
+        # every attempt waits for its own slot, so backoff doesn't hold one
+        if session.scheduler is None:
+            return await session.get(url, headers)
+        return await session.scheduler.run(chain, lambda: session.get(url, headers))
+
+    r = await session.retry_policy(chain).call(request)
+    seconds = time.perf_counter() - started
+    logger.debug(
+            "got %d bytes from %s in %.3fs", len(r.content), url, seconds,
+            extra={"chain": chain.value, "url": url, "status": r.status_code, "size": len(r.content), "seconds": seconds},
+            )
+    metrics.fetched(chain, seconds, len(r.content))
+
+    return r
+
+async def get_page_content(wallet: str, pro_code: str, chain: Chain, session: ZkSession | None = None, extra_wallets: tuple[str, ...] = ()) -> bytes:
+    if session is None:
+        session = get_default_session()
+    url = gen_url(wallet, pro_code, chain, session.base_url, extra_wallets)
+    # a page of several wallets is cached under the whole group, in order: it
+    # can't stand in for a single wallet's page, whose data is in slot 1
+    cache_key = ",".join((wallet, *extra_wallets))
+    if session.cache is not None:
+        page = session.cache.get(cache_key, pro_code, chain)
+        if page is not None:
+            return page
+        if session.cache.cache_only:
+            raise CacheMissException(url)
+
+    async def fetch() -> bytes:
+        r = await fetch_page(url, chain, session)
+        page = r.content
+        if session.cache is not None and r.status_code == 200:
+            session.cache.set(cache_key, pro_code, chain, page)
+
+        return page
+
+    # concurrent requests for the same url share one download
+    return await session.flights.do(url, fetch)
+
+# pages are the response body as bytes; str pages (e.g. given by callers) work too
+Page = str | bytes
+
+@lru_cache(maxsize=256)
+def _compile(regex: str, binary: bool) -> re.Pattern:
+    return re.compile(regex.encode() if binary else regex)
+
+def _pattern(regex: str, content: Page) -> re.Pattern:
+    # bytes pages are searched with the bytes version of a pattern and only
+    # the matched values are decoded
+    return _compile(regex, isinstance(content, bytes))
+
+def _text(value: str | bytes) -> str:
+    return value.decode(errors="replace") if isinstance(value, bytes) else value
+
+_DECLARATION = re.compile(r"const ([\w$]+) = (?=([a-zA-Z\d\".;]+))")
+_WINDOW_DECLARATION = re.compile(r"window\.([\w$]+) = (?=([\d\".;]+))")
+
+
+class VariableNotFoundException(AttributeError):
+    pass
 
-    return str(r.content)
+class ElementNotFoundException(AttributeError):
+    pass
 
-def get_var_declaration_value(content: str, variable_name: str, declaration: str | None = None) -> str:
-    var_declaration = f"const {variable_name} = ([a-zA-Z\\d\".;]+)"
-    if declaration: var_declaration = declaration
-    match = re.search(var_declaration, content)
-    value: str = match.group(1)
-    val = value.split("//")[0].replace(";", "").replace('"', "").replace("None", "-1")
-    if val == "":
-        return "0"
 
-    return val
+class PageIndex:
+    """Every `const NAME = value` / `window.NAME = value` of a page, found in one scan.
 
-def find_match(content: str, regex: str):
-    return re.search(regex, content).group()
+    The first declaration of a name wins, as with a regex search from the page start.
+    The page is scanned on the first variable lookup; elements looked up by id are
+    parsed once and kept for further lookups.
+    """
 
-def get_eth_price(page: str) -> float:
-    value = float(get_var_declaration_value(page, "window.ethusd_price", "window.ethusd_price = ([\\d\".;]+)"))
+    def __init__(self, content: Page):
+        self.content = content
+        self._subtrees: dict[str, ElementSubtree | None] = {}
 
-    return value
+    @cached_property
+    def variables(self) -> dict[str, str]:
+        variables: dict[str, str] = {}
+        # values are matched in a lookahead so a value running into the next
+        # declaration (`1;const b = 2`) doesn't hide that declaration
+        for match in _pattern(_DECLARATION.pattern, self.content).finditer(self.content):
+            variables.setdefault(_text(match.group(1)), _text(match.group(2)))
+        for match in _pattern(_WINDOW_DECLARATION.pattern, self.content).finditer(self.content):
+            variables.setdefault(f"window.{_text(match.group(1))}", _text(match.group(2)))
 
-def str_array(arr: str) -> list[int]:
-    return re.findall(r"\d+", arr)
+        return variables
+
+    def raw(self, variable_name: str) -> str:
+        try:
+            return self.variables[variable_name]
+        except KeyError:
+            raise VariableNotFoundException(variable_name) from None
+
+    def value(self, variable_name: str) -> str:
+        return _clean_value(self.raw(variable_name))
+
+    def subtree(self, elem_id: str) -> ElementSubtree | None:
+        if elem_id not in self._subtrees:
+            self._subtrees[elem_id] = get_element_subtree(self.content, elem_id)
+
+        return self._subtrees[elem_id]
 
-def get_elem_content(page: str, elem_id: str) -> str | None:
-    bs = BeautifulSoup(page, "html.parser")
+    def element_content(self, elem_id: str) -> str | None:
+        subtree = self.subtree(elem_id)
+        if not subtree: return None
 
-    elem = bs.select_one(f"#{elem_id}")
-    if not elem: return None
-    
-    return "".join(map(lambda x: str(x), elem.contents))
+        return subtree.inner_html()
 
+    def table_row_value(self, table_id: str, row: int) -> str:
+        # inner html of the last cell of the row-th <tr> of the table
+        table = self.subtree(table_id)
+        if not table: raise ElementNotFoundException(table_id)
 
-def get_table_row_value(page: str, row: int) -> str:
-    bs = BeautifulSoup(page, "html.parser")
+        r = table.find_all("tr")[row]
+        column = table.find_all("td", within=r)[-1]
 
-    table = bs.select_one("#walletResults1")
+        return table.inner_html(column)
 
-    rows = table.find_all("tr")
-    rows: list[Tag] = list(rows)
+@lru_cache(maxsize=16)
+def page_index(content: Page) -> PageIndex:
+    return PageIndex(content)
+
+def _clean_value(value: str) -> str:
+    val = value.split("//")[0].replace(";", "").replace('"', "").replace("None", "-1")
+    if val == "":
+        return "0"
+
+    return val
+
+def get_var_declaration_value(content: Page, variable_name: str, declaration: str | None = None) -> str:
+    if declaration:
+        match = _pattern(declaration, content).search(content)
+        return _clean_value(_text(match.group(1)))
+
+    return page_index(content).value(variable_name)
+
+def find_match(content: Page, regex: str) -> str:
+    return _text(_pattern(regex, content).search(content).group())
+
+def get_eth_price(page: Page) -> float:
+    value = float(get_var_declaration_value(page, "window.ethusd_price"))
+
+    return value
+
+def str_array(arr: str) -> list[int]:
+    return [int(value) for value in re.findall(r"\d+", arr)]
 
-    r = rows[row]
-    column: Tag = list(r.find_all("td"))[-1]
+def get_elem_content(page: Page, elem_id: str) -> str | None:
+    return page_index(page).element_content(elem_id)
 
-    return "".join(map(lambda x: str(x), column.contents))
+def get_table_row_value(page: Page, row: int) -> str:
+    return page_index(page).table_row_value("walletResults1", row)
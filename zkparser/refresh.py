@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import NamedTuple
+
+from pydantic import BaseModel
+
+from zkparser.parser import Chain, fetch_page, gen_url
+from zkparser.session import ZkSession, get_default_session
+from zkparser.zk import parse_page
+
+
+class PageState(NamedTuple):
+    wallet: str
+    chain: str
+    pro_code: str
+    etag: str | None
+    last_modified: str | None
+    page_hash: str
+    fields_hash: str
+    checked_at: float
+
+
+def fields_hash(result: BaseModel | None) -> str:
+    dumped = "null" if result is None else result.model_dump_json(exclude={"page"}, warnings=False)
+    return hashlib.sha1(dumped.encode()).hexdigest()
+
+
+class RefreshStore:
+    """What the last run saw of each (wallet, chain, pro_code), in SQLite.
+
+    check() revalidates a page with If-None-Match / If-Modified-Since when the
+    site sent ETag / Last-Modified, skips parsing a page whose hash is unchanged
+    and reports whether the parsed fields differ from the stored ones. New
+    states are only written by save(), so a crash before a change is handed on
+    reports it again on the next run.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS states (
+                wallet TEXT NOT NULL,
+                chain TEXT NOT NULL,
+                pro_code TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                page_hash TEXT NOT NULL,
+                fields_hash TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (wallet, chain, pro_code)
+            )""")
+
+    def get(self, wallet: str, pro_code: str, chain: Chain) -> PageState | None:
+        row = self.db.execute(
+                "SELECT * FROM states WHERE wallet = ? AND chain = ? AND pro_code = ?",
+                (wallet, chain.value, pro_code),
+                ).fetchone()
+        if row is None:
+            return None
+
+        return PageState(*row)
+
+    def save(self, state: PageState):
+        self.db.execute("INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?, ?, ?, ?)", state)
+
+    async def check(
+            self,
+            wallet: str,
+            pro_code: str,
+            chain: Chain,
+            session: ZkSession | None = None,
+            bulk: bool = False,
+            keep_page: bool | None = None,
+            executor: Executor | None = None,
+            ) -> tuple[bool, BaseModel | None, PageState]:
+        # (changed, result, state to save); result is None when the page wasn't parsed
+        session = session or get_default_session()
+        stored = self.get(wallet, pro_code, chain)
+        headers = {}
+        if stored and stored.etag:
+            headers["If-None-Match"] = stored.etag
+        if stored and stored.last_modified:
+            headers["If-Modified-Since"] = stored.last_modified
+
+        r = await fetch_page(gen_url(wallet, pro_code, chain, session.base_url), chain, session, headers)
+        now = time.time()
+        if stored and r.status_code == 304:
+            return False, None, stored._replace(checked_at=now)
+        r.raise_for_status() # an error page says nothing about the wallet
+
+        page_hash = hashlib.sha1(r.content).hexdigest()
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        if stored and page_hash == stored.page_hash:
+            return False, None, stored._replace(etag=etag, last_modified=last_modified, checked_at=now)
+
+        if executor:
+            result = await asyncio.get_running_loop().run_in_executor(executor, parse_page, chain, wallet, r.content, bulk, keep_page)
+        else:
+            result = parse_page(chain, wallet, r.content, bulk, keep_page)
+        state = PageState(wallet, chain.value, pro_code, etag, last_modified, page_hash, fields_hash(result), now)
+
+        return stored is None or state.fields_hash != stored.fields_hash, result, state
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> "RefreshStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,238 @@
+import asyncio
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from zkparser.parser import Chain
+
+
+class Priority(IntEnum):
+    # lower runs first
+    INTERACTIVE = 0
+    BULK = 1
+
+class DeadlineExceededException(Exception):
+    pass
+
+
+T = TypeVar("T")
+
+
+class Claim:
+    """The priority and deadline a fetch runs with.
+
+    A single-flight call carries one claim shared by every caller that joins
+    it. A joiner with a higher priority, a later deadline or none raises the
+    claim for all of them, along with the claims of the calls it makes, so a
+    fetch already queued is moved up instead of holding the joiner back. This
+    only affects the scheduling: each caller still waits until its own deadline.
+    """
+
+    def __init__(self, priority: Priority = Priority.INTERACTIVE, deadline: float | None = None):
+        self.priority = priority
+        self.deadline = deadline # time.monotonic(), None for none
+        self._followers: list[Claim] = []
+        self._on_promote: list[Callable[[], None]] = []
+
+    def follow(self) -> "Claim":
+        # the claim of a call made on this one's behalf, raised along with it
+        claim = Claim(self.priority, self.deadline)
+        self._followers.append(claim)
+        return claim
+
+    def join(self, other: "Claim"):
+        # the caller holding `other` shares this claim's call from now on
+        other._followers.append(self)
+        self.raise_to(other.priority, other.deadline)
+
+    def raise_to(self, priority: Priority, deadline: float | None):
+        promoted = priority < self.priority
+        extended = self.deadline is not None and (deadline is None or deadline > self.deadline)
+        if not (promoted or extended):
+            return
+        if promoted:
+            self.priority = priority
+        if extended:
+            self.deadline = deadline
+        for callback in list(self._on_promote):
+            callback()
+        for follower in self._followers:
+            follower.raise_to(priority, deadline)
+
+
+_priority: ContextVar[Priority] = ContextVar("zkparser_priority", default=Priority.INTERACTIVE)
+_deadline: ContextVar[float | None] = ContextVar("zkparser_deadline", default=None)
+_claim: ContextVar[Claim | None] = ContextVar("zkparser_claim", default=None)
+
+@contextmanager
+def priority(value: Priority) -> Iterator[None]:
+    # fetches made inside the block (and tasks created in it) get this priority;
+    # get_wallets_many runs its lookups as BULK
+    tokens = _priority.set(value), _claim.set(None)
+    try:
+        yield
+    finally:
+        _claim.reset(tokens[1])
+        _priority.reset(tokens[0])
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    # fetches made inside the block give up with DeadlineExceededException once
+    # `seconds` have passed, whether still queued or downloading; nested blocks
+    # keep the earliest deadline. Only honoured by sessions with a scheduler.
+    at = time.monotonic() + seconds
+    current = current_claim().deadline
+    tokens = _deadline.set(at if current is None else min(current, at)), _claim.set(None)
+    try:
+        yield
+    finally:
+        _claim.reset(tokens[1])
+        _deadline.reset(tokens[0])
+
+def current_claim() -> Claim:
+    # inside a single-flight call, the claim it shares with its callers
+    claim = _claim.get()
+    if claim is None:
+        return Claim(_priority.get(), _deadline.get())
+
+    return claim
+
+def current_priority() -> Priority:
+    return current_claim().priority
+
+async def run_claimed(claim: Claim, call: Callable[[], Awaitable[T]]) -> T:
+    # runs call() (in its own task) with the fetches it makes under `claim`
+    _claim.set(claim)
+    return await call()
+
+async def _within(claim: Claim, future: asyncio.Future, message: str):
+    # waits for the future until the claim's deadline, which joiners may extend
+    while True:
+        timeout = None if claim.deadline is None else claim.deadline - time.monotonic()
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceededException(message)
+        done, _ = await asyncio.wait((future,), timeout=timeout)
+        if done:
+            return future.result()
+
+
+@dataclass(eq=False)
+class _Waiter:
+    seq: int
+    future: asyncio.Future
+    priority: Priority # the queue it currently counts in
+
+
+class FetchScheduler:
+    """Decides which queued fetch of a session runs next.
+
+    At most `concurrency` fetches run at once, and at most `quotas[chain]` of
+    one chain, so a sweep of one chain can't take every slot. Waiting fetches
+    are started by priority (see `priority`), then in arrival order among the
+    chains under their quota. `reserve` slots are kept for INTERACTIVE fetches
+    so they don't wait for running BULK ones to finish, which is also why they
+    may go up to `reserve` past a chain's quota. Keep `concurrency` at most the
+    session's max_connections, or fetches queue in httpx's pool instead, where
+    priorities don't apply. A queued fetch whose Claim is raised moves up.
+    """
+
+    def __init__(self, concurrency: int = 100, quotas: "dict[Chain, int] | None" = None, reserve: int = 0):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if not 0 <= reserve < concurrency:
+            raise ValueError("reserve must leave at least one slot for bulk fetches")
+        self.concurrency = concurrency
+        self.quotas = quotas or {}
+        self.reserve = reserve
+        self.running = 0
+        self.running_by_chain: Counter = Counter()
+        self._seq = 0
+        self._queues: dict[Priority, dict["Chain", deque[_Waiter]]] = {p: {} for p in Priority}
+
+    def waiting(self, priority: Priority | None = None) -> int:
+        queues = self._queues.items() if priority is None else ((priority, self._queues[priority]),)
+        return sum(
+                not waiter.future.done() and waiter.priority == queue_priority
+                for queue_priority, by_chain in queues for queue in by_chain.values() for waiter in queue
+                )
+
+    async def run(self, chain: "Chain", call: Callable[[], Awaitable[T]]) -> T:
+        # call() in a slot of the chain, within the current claim's deadline
+        claim = current_claim()
+        await self.acquire(chain, claim)
+        try:
+            task = asyncio.ensure_future(call())
+            try:
+                return await _within(claim, task, f"{chain.value} fetch ran past its deadline")
+            finally:
+                task.cancel() # a no-op once it's done
+        finally:
+            self.release(chain)
+
+    async def acquire(self, chain: "Chain", claim: Claim | None = None):
+        # waits for a slot, at the claim's priority (raised while waiting) until its deadline
+        claim = claim or Claim()
+        if claim.deadline is not None and claim.deadline <= time.monotonic():
+            raise DeadlineExceededException(f"{chain.value} fetch past its deadline before it was queued")
+        self._seq += 1
+        waiter = _Waiter(self._seq, asyncio.get_running_loop().create_future(), claim.priority)
+        self._queues[waiter.priority].setdefault(chain, deque()).append(waiter)
+
+        def promote():
+            if not waiter.future.done() and claim.priority < waiter.priority:
+                waiter.priority = claim.priority
+                self._queues[waiter.priority].setdefault(chain, deque()).append(waiter)
+                self._dispatch()
+
+        claim._on_promote.append(promote)
+        try:
+            self._dispatch()
+            if not waiter.future.done():
+                await _within(claim, waiter.future, f"{chain.value} fetch still queued at its deadline")
+        except BaseException:
+            if waiter.future.done():
+                self.release(chain) # granted just as we gave up
+            else:
+                waiter.future.cancel() # skipped by _dispatch
+            raise
+        finally:
+            claim._on_promote.remove(promote)
+
+    def release(self, chain: "Chain"):
+        self.running -= 1
+        self.running_by_chain[chain] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while True:
+            best = None
+            for priority, by_chain in self._queues.items():
+                limit = self.concurrency - (self.reserve if priority > Priority.INTERACTIVE else 0)
+                if self.running >= limit:
+                    continue
+                for chain, queue in by_chain.items():
+                    # drop waiters that gave up or moved to a higher priority queue
+                    while queue and (queue[0].future.done() or queue[0].priority != priority):
+                        queue.popleft()
+                    quota = self.quotas.get(chain, self.concurrency)
+                    if priority == Priority.INTERACTIVE:
+                        quota += self.reserve
+                    if not queue or self.running_by_chain[chain] >= quota:
+                        continue
+                    if best is None or queue[0].seq < best[1][0].seq:
+                        best = (chain, queue)
+                if best:
+                    break
+            if best is None:
+                return
+
+            chain, queue = best
+            waiter = queue.popleft()
+            self.running += 1
+            self.running_by_chain[chain] += 1
+            waiter.future.set_result(None)
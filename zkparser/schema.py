@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Literal
+
+from pydantic import BaseModel
+
+from zkparser.parser import Chain, ElementNotFoundException, Page, VariableNotFoundException, _clean_value, _pattern, _text, page_index
+
+
+@dataclass(frozen=True)
+class SchemaField:
+    name: str # model field, or a value only `derive` reads
+    source: str # variable name, element id, table id or regex, by kind
+    type: Callable[[str], Any] = str
+    kind: Literal["var", "element", "table_row", "match"] = "var"
+    row: int = 0 # for table_row
+    within: str | None = None # element id a match is searched in, default the whole page
+    sentinel: Any = None # converted value standing for None, e.g. -1
+
+def var(name: str, variable: str, type: Callable[[str], Any] = str, sentinel: Any = None) -> SchemaField:
+    return SchemaField(name, variable, type, sentinel=sentinel)
+
+def element(name: str, elem_id: str, type: Callable[[str], Any] = str) -> SchemaField:
+    return SchemaField(name, elem_id, type, kind="element")
+
+def table_row(name: str, table_id: str, row: int, type: Callable[[str], Any] = str) -> SchemaField:
+    return SchemaField(name, table_id, type, kind="table_row", row=row)
+
+def match(name: str, regex: str, within: str | None = None) -> SchemaField:
+    return SchemaField(name, regex, kind="match", within=within)
+
+def flag(value: str) -> bool:
+    return bool(int(value))
+
+
+_schemas: dict[tuple[Chain, str | None], list["Schema"]] = {}
+
+class SchemaNotRegisteredException(Exception):
+    pass
+
+class Schema:
+    """How one model is read off a chain's page.
+
+    All `var` fields of every schema of a chain are found by one combined regex
+    (one more for `window.` variables) in a scan shared by the chain's schemas,
+    as ERA and Lite read the same page. `defaults` fills fields the page doesn't
+    have, `derive(values, **context)` computes the rest in place; values that
+    aren't model fields are dropped afterwards. Schemas naming a `scan` share a
+    separate scan, keeping variables of rarely used schemas out of the main one.
+    A schema only takes part in its chain's scan once `register`ed.
+    """
+
+    def __init__(
+            self,
+            chain: Chain,
+            model: type[BaseModel],
+            fields: list[SchemaField],
+            defaults: dict[str, Any] | None = None,
+            derive: Callable[..., None] | None = None,
+            scan: str | None = None,
+            ):
+        self.chain = chain
+        self.model = model
+        self.fields = fields
+        self.defaults = defaults or {}
+        self.derive = derive
+        self.scan = scan
+
+    def extract(self, page: Page, **context) -> dict[str, Any]:
+        # raises AttributeError when the page lacks one of the fields
+        if self not in _schemas.get((self.chain, self.scan), ()):
+            raise SchemaNotRegisteredException(f"{self.model.__name__} schema of {self.chain.value} isn't registered")
+        found = declarations(self.chain, page, self.scan)
+        values = dict(self.defaults)
+        for f in self.fields:
+            if f.kind == "var":
+                try:
+                    raw = _clean_value(found[f.source])
+                except KeyError:
+                    raise VariableNotFoundException(f.source) from None
+            elif f.kind == "element":
+                raw = page_index(page).element_content(f.source)
+            elif f.kind == "table_row":
+                raw = page_index(page).table_row_value(f.source, f.row)
+            else:
+                text = page
+                if f.within is not None:
+                    text = page_index(page).element_content(f.within)
+                    if text is None: raise ElementNotFoundException(f.within)
+                raw = _text(_pattern(f.source, text).search(text).group())
+            value = raw if raw is None else f.type(raw)
+            if f.sentinel is not None and value == f.sentinel:
+                value = None
+            values[f.name] = value
+        if self.derive:
+            self.derive(values, **context)
+
+        return {name: value for name, value in values.items() if name in self.model.model_fields}
+
+
+class _Scanner:
+    def __init__(self, variables: set[str]):
+        def alternation(names):
+            return "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+
+        consts = {name for name in variables if not name.startswith("window.")}
+        windows = {name.removeprefix("window.") for name in variables if name.startswith("window.")}
+        # same value classes as parser._DECLARATION / _WINDOW_DECLARATION; kept as two
+        # patterns so each keeps its literal prefix, which re searches for quickly
+        self.consts = rf"const ({alternation(consts)}) = (?=([a-zA-Z\d\".;]+))"
+        self.windows = rf"window\.({alternation(windows)}) = (?=([\d\".;]+))"
+        self.const_count = len(consts)
+        self.window_count = len(windows)
+
+    def scan(self, content: Page) -> dict[str, str]:
+        found: dict[str, str] = {}
+        for regex, prefix, count in ((self.consts, "", self.const_count), (self.windows, "window.", self.window_count)):
+            if not count:
+                continue
+            names: dict[str | bytes, str | bytes] = {}
+            for m in _pattern(regex, content).finditer(content):
+                names.setdefault(m.group(1), m.group(2))
+                if len(names) == count:
+                    break # the first declaration of a name wins, as in PageIndex
+            found.update((prefix + _text(name), _text(value)) for name, value in names.items())
+
+        return found
+
+def register(*schemas: Schema):
+    # adds the schemas' variables to the scans of their chains
+    for schema in schemas:
+        _schemas.setdefault((schema.chain, schema.scan), []).append(schema)
+    _scanner.cache_clear()
+    declarations.cache_clear()
+
+def unregister(*schemas: Schema):
+    for schema in schemas:
+        _schemas[(schema.chain, schema.scan)].remove(schema)
+    _scanner.cache_clear()
+    declarations.cache_clear()
+
+@lru_cache(maxsize=None)
+def _scanner(chain: Chain, scan: str | None) -> _Scanner:
+    return _Scanner({f.source for schema in _schemas.get((chain, scan), []) for f in schema.fields if f.kind == "var"})
+
+@lru_cache(maxsize=16)
+def declarations(chain: Chain, content: Page, scan: str | None = None) -> dict[str, str]:
+    # raw values of the variables the chain's schemas read
+    return _scanner(chain, scan).scan(content)
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Sequence
+
+if TYPE_CHECKING:
+    from zkparser.zk import WalletEra, WalletLite
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    # a wallet scores a point for every value strictly above its threshold
+    balance: float = 0.005
+    transactions: int = 10
+    internal_txdone: int = 2
+    aggregate_eth: float = 1
+    lite_transactions: int = 0
+    # bonus points, the native bridge counts as one too
+    protocols_amount: int = 3
+
+
+# (low, high) earning band by [activity points 0..5][bonus points 0..2]
+BANDS: tuple[tuple[tuple[int, int], ...], ...] = (
+        ((0, 0), (0, 0), (0, 0)),
+        ((0, 0), (500, 800), (800, 1200)),
+        ((500, 800), (800, 1200), (1200, 1600)),
+        ((800, 1200), (1200, 1600), (1600, 3000)),
+        ((1200, 1600), (1600, 3000), (3000, 6000)),
+        ((1600, 3000), (3000, 6000), (6000, 8000)),
+        )
+
+
+class PotentialScorer:
+    """Potential Lite earning of ERA wallets, one at a time or over whole columns.
+
+    score_many takes array-likes (e.g. columns loaded with zkparser.columnar) and
+    needs numpy.
+    """
+
+    def __init__(self, thresholds: Thresholds = Thresholds(), bands: Sequence[Sequence[tuple[int, int]]] = BANDS):
+        if len(bands) != 6 or any(len(row) != 3 for row in bands):
+            raise ValueError("bands must have 6 rows (activity points) of 3 bands (bonus points)")
+        self.thresholds = thresholds
+        self.bands = tuple(tuple(tuple(band) for band in row) for row in bands)
+
+    def score(self, we: "WalletEra", wl: "WalletLite") -> tuple[int, int]:
+        t = self.thresholds
+        points = sum(map(bool, (
+                we.balance > t.balance,
+                we.transactions > t.transactions,
+                we.internal_txdone > t.internal_txdone,
+                we.aggregate_eth > t.aggregate_eth,
+                wl.transactions > t.lite_transactions,
+                )))
+        bonus = bool(we.protocols_amount > t.protocols_amount) + bool(we.is_native_bridge_used)
+
+        return self.bands[points][bonus]
+
+    def score_many(
+            self,
+            balance: Any,
+            transactions: Any,
+            internal_txdone: Any,
+            aggregate_eth: Any,
+            protocols_amount: Any,
+            is_native_bridge_used: Any,
+            lite_transactions: Any,
+            ) -> tuple[Any, Any]:
+        import numpy
+
+        t = self.thresholds
+        points = (numpy.asarray(balance) > t.balance).astype(numpy.intp)
+        points += numpy.asarray(transactions) > t.transactions
+        points += numpy.asarray(internal_txdone) > t.internal_txdone
+        points += numpy.asarray(aggregate_eth) > t.aggregate_eth
+        points += numpy.asarray(lite_transactions) > t.lite_transactions
+        bonus = (numpy.asarray(protocols_amount) > t.protocols_amount).astype(numpy.intp)
+        bonus += numpy.asarray(is_native_bridge_used, dtype=bool)
+
+        table = numpy.array(self.bands, dtype=numpy.int64)
+        bands = table[points, bonus]
+
+        return bands[..., 0], bands[..., 1]
+
+    def score_columns(self, era: dict[str, Any], lite: dict[str, Any]) -> tuple[Any, Any]:
+        # WalletEra and WalletLite columns of the same wallets, in the same order
+        return self.score_many(
+                era["balance"],
+                era["transactions"],
+                era["internal_txdone"],
+                era["aggregate_eth"],
+                era["protocols_amount"],
+                era["is_native_bridge_used"],
+                lite["transactions"],
+                )
+
+
+default_scorer = PotentialScorer()
@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs
+
+from pydantic import BaseModel
+
+from zkparser.cache import ModelCache, PageCache
+from zkparser.session import ZkSession
+from zkparser.zk import (
+        ERA_BATCH_SIZE,
+        get_wallet_era,
+        get_wallet_era_full,
+        get_wallet_lite,
+        get_wallet_linea,
+        get_wallet_linea_mainnet,
+        get_wallet_linea_testnet,
+        get_wallet_profile,
+        get_wallet_scroll,
+        get_wallet_starknet,
+        get_wallet_sybil,
+        get_wallet_zero,
+        get_wallets_era_full,
+                    )
+
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = {
+        "era": get_wallet_era,
+        "lite": get_wallet_lite,
+        "era_full": get_wallet_era_full,
+        "zero": get_wallet_zero,
+        "starknet": get_wallet_starknet,
+        "scroll": get_wallet_scroll,
+        "linea": get_wallet_linea,
+        "linea_mainnet": get_wallet_linea_mainnet,
+        "linea_testnet": get_wallet_linea_testnet,
+        "sybil": get_wallet_sybil,
+        "profile": get_wallet_profile,
+        }
+
+# lookups read off the ERA page, which holds up to ERA_BATCH_SIZE wallets
+ERA_LOOKUPS = {"era": 0, "lite": 1, "era_full": None}
+
+
+class QueueFullException(Exception):
+    pass
+
+
+def _dump(result: Any) -> Any:
+    if isinstance(result, BaseModel):
+        return result.model_dump(mode="json", exclude={"page"}, warnings=False)
+    if isinstance(result, tuple):
+        return [_dump(item) for item in result]
+
+    return result
+
+def _percentile(samples: list[float], q: float) -> float | None:
+    if not samples: return None
+    ordered = sorted(samples)
+
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class _Request:
+    key: tuple[str, str, str] # (lookup, wallet, pro_code)
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class LookupService:
+    """The get_wallet_* lookups as a JSON over HTTP service, an ASGI app.
+
+    All callers share one session, so one connection pool, single-flight and
+    ModelCache (and PageCache if the session has one). Requests are queued and
+    taken in micro-batches: whatever arrives within `window` seconds of the
+    first, up to `max_batch`. Identical requests of a batch are looked up once
+    and, with the experimental `era_batch`, ERA lookups of different wallets
+    share pages four wallets at a time (see get_wallets_era_full). At most
+    `concurrency` lookups run at once and more than `max_queue` waiting
+    requests are turned away with 503. A session the service owns (one it
+    made, or build_service's) is closed with it, PageCache included.
+
+    GET  /lookup/<name>?wallet=W[&pro_code=P]  one lookup, {"result": ...}
+    POST /lookup  [{"lookup": name, "wallet": W, "pro_code": P}, ...]
+    GET  /stats  requests waiting, lookups in flight and p50/p99 latency in seconds
+    """
+
+    def __init__(
+            self,
+            session: ZkSession | None = None,
+            pro_code: str = "",
+            window: float = 0.01,
+            max_batch: int = 64,
+            concurrency: int = 32,
+            max_queue: int = 10_000,
+            era_batch: bool = False,
+            latency_samples: int = 10_000,
+            ):
+        self.owns_session = session is None
+        self.session = session or ZkSession(models=ModelCache())
+        self.pro_code = pro_code
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.era_batch = era_batch
+        self.requests = 0
+        self.batches = 0
+        self.in_flight = 0
+        self.pending = 0 # requests queued or running, bounded by max_queue
+        self._held = 0 # requests taken into a batch whose lookup hasn't started
+        self.latencies: deque[float] = deque(maxlen=latency_samples)
+        self._queue: asyncio.Queue[_Request] | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._batcher: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def _start(self):
+        if self._batcher is None or self._batcher.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._batcher = asyncio.create_task(self._collect())
+
+    async def aclose(self):
+        for task in (self._batcher, *self._tasks):
+            if task is not None:
+                task.cancel()
+        self._batcher = None
+        if self.owns_session:
+            await self.session.aclose()
+            if self.session.cache is not None:
+                self.session.cache.close()
+
+    async def lookup(self, name: str, wallet: str, pro_code: str | None = None) -> Any:
+        # queues one lookup and waits for its batch to run it
+        if name not in LOOKUPS:
+            raise KeyError(name)
+        self._start()
+        request = _Request((name, wallet, self.pro_code if pro_code is None else pro_code), asyncio.get_running_loop().create_future())
+        if self.pending >= self.max_queue:
+            raise QueueFullException(f"{self.pending} requests already waiting")
+        self._queue.put_nowait(request)
+        self.requests += 1
+        self.pending += 1
+        try:
+            return await request.future
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict[str, Any]:
+        samples = list(self.latencies)
+        return {
+                "queue_depth": (self._queue.qsize() if self._queue else 0) + self._held,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "batches": self.batches,
+                "latency_p50": _percentile(samples, 0.5),
+                "latency_p99": _percentile(samples, 0.99),
+                }
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self._held += len(batch)
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[_Request]):
+        waiting: dict[tuple[str, str, str], list[_Request]] = {}
+        for request in batch:
+            waiting.setdefault(request.key, []).append(request)
+
+        def settle(key, result=None, error=None):
+            now = time.perf_counter()
+            for request in waiting.pop(key):
+                if request.future.done():
+                    continue # the caller went away
+                if error is not None:
+                    request.future.set_exception(error)
+                else:
+                    request.future.set_result(result)
+                self.latencies.append(now - request.queued_at)
+
+        def started(keys):
+            self._held -= sum(len(waiting[key]) for key in keys)
+            self.in_flight += 1
+
+        async def one(key):
+            name, wallet, pro_code = key
+            async with self._slots:
+                started([key])
+                try:
+                    result = await LOOKUPS[name](wallet, pro_code, session=self.session, bulk=True)
+                except Exception as e:
+                    settle(key, error=e)
+                else:
+                    settle(key, result)
+                finally:
+                    self.in_flight -= 1
+
+        async def era_page(pro_code, wallets, keys):
+            async with self._slots:
+                started(keys)
+                try:
+                    fulls = await get_wallets_era_full(wallets, pro_code, self.session, bulk=True)
+                except Exception as e:
+                    for key in keys:
+                        settle(key, error=e)
+                    return
+                finally:
+                    self.in_flight -= 1
+            fulls = dict(zip(wallets, fulls))
+            for key in keys:
+                full, index = fulls[key[1]], ERA_LOOKUPS[key[0]]
+                settle(key, full if full is None or index is None else full[index])
+
+        keys, jobs = list(waiting), []
+        if self.era_batch:
+            era: dict[str, dict[str, list]] = {} # pro_code -> wallet -> keys
+            for key in keys:
+                if key[0] in ERA_LOOKUPS:
+                    era.setdefault(key[2], {}).setdefault(key[1], []).append(key)
+            keys = [key for key in keys if key[0] not in ERA_LOOKUPS]
+            for pro_code, keys_by_wallet in era.items():
+                wallets = list(keys_by_wallet)
+                for start in range(0, len(wallets), ERA_BATCH_SIZE):
+                    chunk = wallets[start:start + ERA_BATCH_SIZE]
+                    jobs.append(era_page(pro_code, chunk, [key for wallet in chunk for key in keys_by_wallet[wallet]]))
+        jobs.extend(one(key) for key in keys)
+        await asyncio.gather(*jobs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"].rstrip("/"), scope["method"]
+        if path == "/stats" and method == "GET":
+            await self._respond(send, 200, self.stats())
+        elif path.startswith("/lookup/") and method == "GET":
+            query = {name: values[-1] for name, values in parse_qs(scope["query_string"].decode()).items()}
+            if "wallet" not in query:
+                await self._respond(send, 400, {"error": "wallet is required"})
+                return
+            status, body = await self._answer(path.removeprefix("/lookup/"), query["wallet"], query.get("pro_code"))
+            await self._respond(send, status, body)
+        elif path == "/lookup" and method == "POST":
+            try:
+                items = json.loads(await self._body(receive))
+                answers = await asyncio.gather(*[self._answer(item["lookup"], item["wallet"], item.get("pro_code")) for item in items])
+            except (ValueError, TypeError, KeyError) as e:
+                await self._respond(send, 400, {"error": f"expected a list of lookups: {e!r}"})
+                return
+            await self._respond(send, 200, [body for _, body in answers])
+        else:
+            await self._respond(send, 404, {"error": "not found"})
+
+    async def _answer(self, name: str, wallet: str, pro_code: str | None) -> tuple[int, dict]:
+        if name not in LOOKUPS:
+            return 404, {"error": f"unknown lookup {name!r}, one of {', '.join(LOOKUPS)}"}
+        try:
+            return 200, {"result": _dump(await self.lookup(name, wallet, pro_code))}
+        except QueueFullException as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            logger.warning("%s lookup of %s failed: %r", name, wallet, e)
+            return 502, {"error": repr(e)}
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    @staticmethod
+    async def _respond(send, status: int, body: Any):
+        content = json.dumps(body).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())]
+        if status == 503:
+            headers.append((b"retry-after", b"1"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": content})
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+            prog="python -m zkparser.service",
+            description="Serve the wallet lookups as JSON over HTTP, shared by every caller. Needs uvicorn.",
+            )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pro-code", default="", help="used by requests that don't give one")
+    parser.add_argument("--window", type=float, default=0.01, help="seconds to gather requests into one batch")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32, help="lookups running at once")
+    parser.add_argument("--max-queue", type=int, default=10_000, help="waiting requests before answering 503")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--era-batch", action="store_true", help="experimental: fetch ERA pages four wallets at a time; the multi-wallet page layout is guessed and checked per page")
+    parser.add_argument("--cache", metavar="DIR", help="keep fetched pages in a page cache in this directory, created if missing")
+    parser.add_argument("--verbose", action="store_true", help="log every request to stderr")
+
+    return parser.parse_args(argv)
+
+def build_service(args: argparse.Namespace) -> LookupService:
+    session = ZkSession(
+            max_connections=args.max_connections,
+            cache=PageCache(Path(args.cache) / "pages.sqlite") if args.cache else None,
+            models=ModelCache(),
+            )
+    service = LookupService(
+            session,
+            pro_code=args.pro_code,
+            window=args.window,
+            max_batch=args.max_batch,
+            concurrency=args.concurrency,
+            max_queue=args.max_queue,
+            era_batch=args.era_batch,
+            )
+    service.owns_session = True # nothing else holds it, so shutdown closes it
+
+    return service
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ImportError("the service needs uvicorn: pip install uvicorn") from e
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    uvicorn.run(build_service(args), host=args.host, port=args.port, lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+from typing import TYPE_CHECKING
+import httpx
+
+from zkparser.cache import ModelCache, PageCache, SingleFlight
+from zkparser.scheduler import FetchScheduler
+from zkparser.utils import RetryPolicy
+
+if TYPE_CHECKING:
+    from zkparser.parser import Chain
+
+
+BASE_URL = "https://www.10kdrop.com"
+
+
+class ZkSession:
+    """Owns one long-lived httpx client so lookups reuse pooled connections.
+
+    Can be used as an async context manager; module-level functions fall back
+    to a shared default session (see get_default_session).
+    HTTP/2 needs the optional `h2` package (`pip install httpx[http2]`).
+    With a PageCache, pages are read from and stored to disk around each fetch.
+    Concurrent identical fetches and lookups are coalesced into one; with a
+    ModelCache, lookup results are also kept in memory for reuse.
+    Downloads are retried according to `retry`, or `retries[chain]` when set.
+    `base_url` points lookups at another host, e.g. a local stand-in server.
+    With a FetchScheduler, downloads wait for it to start them, by priority
+    and per-chain quota.
+    """
+
+    def __init__(
+            self,
+            max_connections: int | None = 100,
+            max_keepalive_connections: int | None = 20,
+            keepalive_expiry: float | None = 30.0,
+            http2: bool = False,
+            timeout: float = 20,
+            transport: httpx.AsyncBaseTransport | None = None,
+            cache: PageCache | None = None,
+            models: ModelCache | None = None,
+            retry: RetryPolicy | None = None,
+            retries: "dict[Chain, RetryPolicy] | None" = None,
+            base_url: str = BASE_URL,
+            scheduler: FetchScheduler | None = None,
+            ):
+        self.limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+                )
+        self.http2 = http2
+        self.timeout = timeout
+        self.transport = transport
+        self.cache = cache
+        self.models = models
+        self.flights = SingleFlight()
+        self.retry = retry or RetryPolicy()
+        self.retries = retries or {}
+        self.base_url = base_url.rstrip("/")
+        self.scheduler = scheduler
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # connections are bound to the loop they were opened on, so a session
+        # reused from another loop (e.g. successive asyncio.run calls) starts over
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                    limits=self.limits,
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    transport=self.transport,
+                    )
+            self._loop = loop
+
+        return self._client
+
+    def retry_policy(self, chain: "Chain") -> RetryPolicy:
+        return self.retries.get(chain, self.retry)
+
+    async def get(self, url: str, headers: dict[str, str] | None = None) -> httpx.Response:
+        return await self.client.get(url, headers=headers)
+
+    async def aclose(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+    async def __aenter__(self) -> "ZkSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_default_session: ZkSession | None = None
+
+def get_default_session() -> ZkSession:
+    global _default_session
+    if _default_session is None:
+        _default_session = ZkSession()
+
+    return _default_session
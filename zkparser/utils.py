@@ -1,6 +1,17 @@
+import asyncio
+import random
+import time
+import warnings
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+import httpx
 from httpx import ReadTimeout
 
 def readtimeout_retry(count: int):
+    # deprecated: sessions retry by their RetryPolicy
+    warnings.warn("readtimeout_retry is deprecated, set a RetryPolicy on the ZkSession instead", DeprecationWarning, stacklevel=2)
+
     def decorator(httpx_function):
         async def wrapper(*args, **kwargs):
             for attempt in range(count):
@@ -16,3 +27,155 @@ def readtimeout_retry(count: int):
         return wrapper
 
     return decorator
+
+
+class RateLimiter:
+    """Token bucket: `rate` acquisitions per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calls for `reset_timeout` seconds after `failure_threshold` failures in a row.
+
+    After the timeout the circuit is half-open: the first check() claims the one
+    trial call and every other caller is still refused until the trial records
+    success (closing the circuit) or failure (opening it again). A trial that
+    records neither within `reset_timeout` is given up and another let through.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_at: float | None = None # when the half-open trial call was let through
+
+    @property
+    def is_open(self) -> bool:
+        # whether a call would be refused now
+        if self.opened_at is None:
+            return False
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            return True
+
+        return self.trial_at is not None and now - self.trial_at < self.reset_timeout
+
+    def check(self):
+        if self.is_open:
+            raise CircuitOpenException(f"circuit open after {self.failures} failures")
+        if self.opened_at is not None:
+            self.trial_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.trial_at = None
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class RetryPolicy:
+    """How a fetch is retried: transport errors and RETRY_STATUSES responses
+    are retried up to `attempts` times in total with exponential backoff and
+    jitter, honouring Retry-After. A shared RateLimiter paces every attempt and
+    an optional CircuitBreaker fails fast while the site keeps failing.
+    """
+
+    def __init__(
+            self,
+            attempts: int = 5,
+            base_delay: float = 0.5,
+            max_delay: float = 30,
+            jitter: float = 0.5,
+            retry_statuses: frozenset[int] = RETRY_STATUSES,
+            rate_limiter: RateLimiter | None = None,
+            breaker: CircuitBreaker | None = None,
+            ):
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def retry_after(self, response: httpx.Response) -> float | None:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+
+        return min(self.max_delay, max(0.0, delay))
+
+    async def call(self, request: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        for attempt in range(self.attempts):
+            last = attempt + 1 == self.attempts
+            if self.breaker:
+                self.breaker.check()
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+
+            try:
+                response = await request()
+            except httpx.TransportError:
+                if self.breaker:
+                    self.breaker.record_failure()
+                if last:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+
+            if response.status_code not in self.retry_statuses:
+                if self.breaker:
+                    self.breaker.record_success()
+                return response
+
+            if self.breaker:
+                self.breaker.record_failure()
+            if last:
+                response.raise_for_status()
+                return response
+            delay = self.retry_after(response)
+            await asyncio.sleep(self.backoff(attempt) if delay is None else delay)
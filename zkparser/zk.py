@@ -1,21 +1,19 @@
-from typing import Literal
+import asyncio
+import dataclasses
+import functools
+import inspect
+from typing import Literal, TypeVar
 from pydantic import BaseModel
 
-from zkparser.parser import (
-        Chain,
-        get_page_content,
-        get_var_declaration_value,
-        find_match,
-        get_eth_price,
-        str_array,
-        get_elem_content,
-        get_table_row_value,
-                    )
+from zkparser.parser import Chain, Page, WrongChainException, _text, get_page_content, page_index, str_array
+from zkparser import metrics, scoring
+from zkparser.schema import Schema, element, flag, match, register, table_row, var
+from zkparser.session import ZkSession, get_default_session
 
 
 class WalletEra(BaseModel):
     wallet: str
-    page: str
+    page: str | None = None # dropped in bulk mode unless keep_page
     rank: int
     balance: float
     balance_usd: float
@@ -78,6 +76,7 @@ class WalletLinea(BaseModel):
     active_weeks: int
     active_days: int
     last_tx_date: str
+    network: Literal["mainnet", "testnet"] = "mainnet" # both are read off the same page
 
 class WalletStarknet(BaseModel):
     wallet: str
@@ -110,47 +109,241 @@ class WalletSybil(BaseModel):
     is_blacklisted: bool
 
 
-async def get_wallet_era(wallet: str, pro_code: str, page: str | None = None) -> WalletEra | None:
-    if not page:
-        page = await get_page_content(wallet, pro_code, Chain.ERA)
-    ethusd = get_eth_price(page)
-
-    try:
-        rank = int(get_var_declaration_value(page, "value1_fixed_erarank"))
-        balance = float(get_var_declaration_value(page, "value1"))
-        balance_usd = balance * ethusd
-        transactions = int(get_var_declaration_value(page, "value2"))
-        last_transaction = find_match(page, r"\d\d\d\d-\d\d-\d\dT\d\d:\d\d:\d\d.\d\d\dZ")
-        total_gas = float(get_var_declaration_value(page, "value1_gasfees"))
-        transaction_months = str_array(get_table_row_value(page, 7))
-        _txdone = int(get_var_declaration_value(page, "value3"))
-        aggregate_eth = float(get_var_declaration_value(page, "value4"))
-        aggregate_usd = float(get_var_declaration_value(page, "valueUsdcPro1unfixed"))
-        aggr_usd_treshold = bool(int(get_var_declaration_value(page, "thresholdUsdcPro1")))
-        if not aggr_usd_treshold:
-            aggregate_usd = None # disable till not implemented on site
-        protocols_amount = int(get_var_declaration_value(page, "valuePro1"))
-        is_native_bridge_used = bool(int(get_var_declaration_value(page, "valuePro2")))
-    except AttributeError:
-        return None
-
-    return WalletEra(
-            wallet=wallet,
-            page=page,
-            rank=rank,
-            balance=balance,
-            balance_usd=balance_usd,
-            transactions=transactions,
-            internal_txdone=_txdone,
-            last_transaction=last_transaction,
-            total_gas=total_gas,
-            transaction_months=transaction_months,
-            aggregate_eth=aggregate_eth,
-            aggregate_usd=aggregate_usd,
-            protocols_amount=protocols_amount,
-            is_native_bridge_used=is_native_bridge_used
+M = TypeVar("M", bound=BaseModel)
+
+def _build(model: type[M], bulk: bool, **fields) -> M:
+    # bulk mode trusts the extracted values and skips pydantic validation
+    if bulk:
+        return model.model_construct(**fields)
+
+    return model(**fields)
+
+
+def _derive_era(values: dict):
+    values["balance_usd"] = values["balance"] * values["ethusd"]
+    if not values["aggregate_usd_enabled"]:
+        values["aggregate_usd"] = None # disable till not implemented on site
+
+def _derive_lite(values: dict, era_total_gas: float):
+    values["total_investment"] = values["total_gas"] + era_total_gas
+    values["total_investment_usd"] = values["total_investment"] * values["ethusd"]
+
+ERA_SCHEMA = Schema(
+        Chain.ERA, WalletEra,
+        [
+            var("ethusd", "window.ethusd_price", float),
+            var("rank", "value1_fixed_erarank", int),
+            var("balance", "value1", float),
+            var("transactions", "value2", int),
+            match("last_transaction", r"\d\d\d\d-\d\d-\d\dT\d\d:\d\d:\d\d.\d\d\dZ"),
+            var("total_gas", "value1_gasfees", float),
+            table_row("transaction_months", "walletResults1", 7, str_array),
+            var("internal_txdone", "value3", int),
+            var("aggregate_eth", "value4", float),
+            var("aggregate_usd", "valueUsdcPro1unfixed", float),
+            var("aggregate_usd_enabled", "thresholdUsdcPro1", flag),
+            var("protocols_amount", "valuePro1", int),
+            var("is_native_bridge_used", "valuePro2", flag),
+            ],
+        derive=_derive_era,
+        )
+
+LITE_SCHEMA = Schema(
+        Chain.ERA, WalletLite,
+        [
+            var("ethusd", "window.ethusd_price", float),
+            var("balance", "value1_lite_bal", float),
+            var("transactions", "value5", int),
+            match("last_transaction", r"\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d"),
+            var("total_gas", "value1_gasfees_lite", float),
+            var("aggregate_eth", "value1_lite_totalamount", float),
+            ],
+        defaults={"potential_earning": (0, 0)}, # scored once the ERA result is known
+        derive=_derive_lite,
+        )
+
+ZERO_SCHEMA = Schema(
+        Chain.ZERO, WalletZero,
+        [
+            var("rank", "value1_fixed", int),
+            var("transactions", "valuePro2", int),
+            var("bridged", "valuePro3", float),
+            var("source_chains", "valuePro4", int),
+            var("destination_chains", "valuePro5", int),
+            var("interacted_contracts", "valuePro6", int),
+            var("active_days", "valuePro7", int),
+            var("active_weeks", "valuePro8", int),
+            var("active_months", "valuePro9", int),
+            ],
+        defaults={"potential_earning": None},
+        )
+
+def _linea_schema(network: str, suffix: str) -> Schema:
+    return Schema(
+            Chain.LINEA, WalletLinea,
+            [
+                var("balance_eth", f"value1_unfixed{suffix}", float, sentinel=-1),
+                var("balance_usdc", f"valuePro1{suffix}", float, sentinel=-1),
+                var("transactions", f"valuePro2{suffix}", float),
+                var("is_native_bridge_used", f"valuePro3{suffix}", flag),
+                var("first_tx_date", f"valuePro4{suffix}"),
+                var("tx_months", f"valuePro5{suffix}", str_array),
+                var("active_months", f"valuePro51{suffix}", int),
+                var("active_weeks", f"valuePro52{suffix}", int),
+                var("active_days", f"valuePro53{suffix}", int),
+                var("last_tx_date", f"valuePro6{suffix}"),
+                ],
+            defaults={"network": network},
             )
 
+LINEA_MAINNET_SCHEMA = _linea_schema("mainnet", "_mn")
+LINEA_TESTNET_SCHEMA = _linea_schema("testnet", "")
+
+STARKNET_SCHEMA = Schema(
+        Chain.STARKNET, WalletStarknet,
+        [
+            var("transactions", "value1_fixed", int),
+            var("tx_months", "valuePro5"),
+            var("active_months", "activeMonthsPro1", int),
+            var("active_weeks", "activeWeeksPro1", int),
+            var("active_days", "activeDaysPro1", int),
+            var("did_swap", "did_swap1Bool", flag),
+            var("did_mint", "did_mint1Bool", flag),
+            var("did_add_liquidity", "did_addLiquidity1Bool", flag),
+            var("did_remove_liquidity", "did_removeLiquidity1Bool", flag),
+            var("total_gas", "totalGasfees1unfixed", float),
+            var("aggregate_tx", "aggregateValueTxPro1unfixed", float),
+            element("first_transaction", "valueFirstTx1"),
+            var("last_transaction", "lastTxPro1"),
+            ],
+        )
+
+SCROLL_SCHEMA = Schema(
+        Chain.SCROLL, WalletScroll,
+        [
+            var("balance_eth", "value1_fixed", float),
+            var("balance_usdc", "valuePro1", float),
+            var("transactions", "valuePro2", int),
+            var("is_native_bridge_used", "valuePro3", flag),
+            var("first_tx_date", "valuePro4"),
+            var("tx_months", "valuePro5", str_array),
+            var("last_tx_date", "valuePro6"),
+            ],
+        )
+
+SYBIL_SCHEMA = Schema(
+        Chain.SYBIL, WalletSybil,
+        [
+            var("is_blacklisted", "blacklisted12", flag),
+            ],
+        )
+
+# Slots 2-4 of a multi-wallet ERA page. Only single-wallet pages have been seen,
+# so these names are a guess following slot 1: names carrying the slot number
+# (value1_gasfees) take the slot's, purely ordinal ones (value2, valuePro1) get a
+# _SLOT suffix. get_wallets_era_full checks every slot before trusting it.
+# Until the names are checked against a real multi-wallet page, batching is
+# experimental and off by default everywhere.
+ERA_SLOT_SOURCES = {
+        "value1_fixed_erarank": "value{slot}_fixed_erarank",
+        "value1": "value1_{slot}",
+        "value2": "value2_{slot}",
+        "value1_gasfees": "value{slot}_gasfees",
+        "walletResults1": "walletResults{slot}",
+        "value3": "value3_{slot}",
+        "value4": "value4_{slot}",
+        "valueUsdcPro1unfixed": "valueUsdcPro{slot}unfixed",
+        "thresholdUsdcPro1": "thresholdUsdcPro{slot}",
+        "valuePro1": "valuePro1_{slot}",
+        "valuePro2": "valuePro2_{slot}",
+        "value1_lite_bal": "value{slot}_lite_bal",
+        "value5": "value5_{slot}",
+        "value1_gasfees_lite": "value{slot}_gasfees_lite",
+        "value1_lite_totalamount": "value{slot}_lite_totalamount",
+        }
+
+def _slot_schema(schema: Schema, slot: int, within: str) -> Schema:
+    # dates are matched inside the slot's own element instead of the whole page
+    fields = []
+    for f in schema.fields:
+        if f.kind == "match":
+            f = dataclasses.replace(f, within=within.format(slot=slot))
+        elif f.source in ERA_SLOT_SOURCES:
+            f = dataclasses.replace(f, source=ERA_SLOT_SOURCES[f.source].format(slot=slot))
+        fields.append(f)
+
+    return Schema(schema.chain, schema.model, fields, schema.defaults, schema.derive, scan="slots")
+
+ERA_SLOT_SCHEMAS = {1: (ERA_SCHEMA, LITE_SCHEMA)} | {
+        slot: (_slot_schema(ERA_SCHEMA, slot, "walletResults{slot}"), _slot_schema(LITE_SCHEMA, slot, "liteResults{slot}"))
+        for slot in range(2, 5)
+        }
+
+register(
+        ERA_SCHEMA, LITE_SCHEMA, ZERO_SCHEMA, LINEA_MAINNET_SCHEMA, LINEA_TESTNET_SCHEMA,
+        STARKNET_SCHEMA, SCROLL_SCHEMA, SYBIL_SCHEMA,
+        *(schema for slot in range(2, 5) for schema in ERA_SLOT_SCHEMAS[slot]),
+        )
+
+def _parse(schema: Schema, wallet: str, page: Page, bulk: bool = False, **context) -> BaseModel | None:
+    with metrics.timed(schema.chain, "extract"):
+        try:
+            fields = schema.extract(page, **context)
+        except AttributeError:
+            return None
+
+    with metrics.timed(schema.chain, "validate"):
+        return _build(schema.model, bulk, wallet=wallet, **fields)
+
+
+def wallet_lookup(chain: Chain):
+    # wraps a get_wallet_* function: identical concurrent calls on a session run
+    # once, and results are reused from the session's ModelCache when it has one;
+    # calls given a ready page bypass both
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            if arguments.get("page"):
+                return await func(*args, **kwargs)
+
+            session = arguments.get("session") or get_default_session()
+            key = (func.__name__, *(value for name, value in arguments.items() if name != "session"))
+            if session.models is not None:
+                try:
+                    return session.models[key]
+                except KeyError:
+                    pass
+            result = await session.flights.do(key, lambda: func(*args, **kwargs))
+            if session.models is not None:
+                session.models[key] = result
+
+            return result
+
+        wrapper.chain = chain
+        return wrapper
+
+    return decorator
+
+
+@wallet_lookup(Chain.ERA)
+async def get_wallet_era(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False, keep_page: bool | None = None) -> WalletEra | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.ERA, session)
+
+    return _parse_era(wallet, page, bulk, keep_page)
+
+def _parse_era(wallet: str, page: Page, bulk: bool = False, keep_page: bool | None = None, slot: int = 1) -> WalletEra | None:
+    we = _parse(ERA_SLOT_SCHEMAS[slot][0], wallet, page, bulk)
+    if we and (keep_page or (keep_page is None and not bulk)):
+        we.page = _text(page) # the model keeps pages as text
+
+    return we
+
 async def get_wallet_era_verbose(wallet: WalletEra) -> WalletEraVerbose | None:
     return WalletEraVerbose(
             wallet=wallet.wallet,
@@ -166,261 +359,211 @@ async def get_wallet_era_verbose(wallet: WalletEra) -> WalletEraVerbose | None:
             is_native_bridge_used=wallet.is_native_bridge_used
             )
 
-async def get_wallet_lite(wallet: str, pro_code: str, page: str | None = None) -> WalletLite | None:
+@wallet_lookup(Chain.ERA)
+async def get_wallet_lite(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False, keep_page: bool | None = None) -> WalletLite | None:
+    full = await get_wallet_era_full(wallet, pro_code, page, session, bulk, keep_page)
+    if not full: return None
+
+    return full[1]
+
+@wallet_lookup(Chain.ERA)
+async def get_wallet_era_full(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False, keep_page: bool | None = None) -> tuple[WalletEra, WalletLite] | None:
+    # ERA and Lite live on the same page: fetch and scan it once for both
     if not page:
-        page = await get_page_content(wallet, pro_code, Chain.ERA)
-    ethusd = get_eth_price(page)
-    try:
-        balance = float(get_var_declaration_value(page, "value1_lite_bal"))
-        transactions = int(get_var_declaration_value(page, "value5"))
-        last_transaction = find_match(page, r"\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d")
-        total_gas = float(get_var_declaration_value(page, "value1_gasfees_lite"))
-        aggregate_eth = float(get_var_declaration_value(page, "value1_lite_totalamount"))
-        total_investment = total_gas + float(get_var_declaration_value(page, "value1_gasfees"))
-        total_investment_usd = total_investment * ethusd
-    except AttributeError:
-        return None
-    
-    we = await get_wallet_era(wallet, pro_code, page)
+        page = await get_page_content(wallet, pro_code, Chain.ERA, session)
+
+    return _parse_era_full(wallet, page, bulk, keep_page)
+
+def _parse_era_full(wallet: str, page: Page, bulk: bool = False, keep_page: bool | None = None, slot: int = 1) -> tuple[WalletEra, WalletLite] | None:
+    we = _parse_era(wallet, page, bulk, keep_page, slot)
     if not we: return None
-    wl = WalletLite(
-            wallet=wallet,
-            balance=balance,
-            transactions=transactions,
-            last_transaction=last_transaction,
-            total_gas=total_gas,
-            aggregate_eth=aggregate_eth,
-            total_investment=total_investment,
-            total_investment_usd=total_investment_usd,
-            potential_earning=(0, 0)
-            )
-    potential_earning = _calc_potential_lite(we, wl)
-    wl.potential_earning = potential_earning
+    wl = _parse(ERA_SLOT_SCHEMAS[slot][1], wallet, page, bulk, era_total_gas=we.total_gas)
+    if not wl: return None
+    wl.potential_earning = _calc_potential_lite(we, wl)
+
+    return we, wl
+
+ERA_BATCH_SIZE = 4
+
+# base url -> whether its ERA pages really hold one wallet per slot, once known
+_era_batching: dict[str, bool] = {}
 
-    return wl
+def _slot_holds(page: Page, slot: int, wallet: str) -> bool:
+    # a slot's results table names its wallet
+    table = page_index(page).element_content(f"walletResults{slot}")
+    return table is not None and wallet.lower() in table.lower()
+
+async def get_wallets_era_full(wallets: list[str], pro_code: str, session: ZkSession | None = None, bulk: bool = False, keep_page: bool | None = None) -> list[tuple[WalletEra, WalletLite] | None]:
+    """ERA and Lite results of up to four wallets, read off one multi-wallet page.
+
+    Experimental: the variable names of slots 2-4 (ERA_SLOT_SOURCES) are a guess
+    not yet checked against a real page.
+
+    A wallet whose slot doesn't check out (or has no data) is looked up on its
+    own page. When a page turns out not to hold the extra wallets, or one parsed
+    alone where its slot didn't, the host is fetched one wallet per page from
+    then on. With keep_page the results keep the shared page.
+    """
+    if not 0 < len(wallets) <= ERA_BATCH_SIZE:
+        raise ValueError(f"between 1 and {ERA_BATCH_SIZE} wallets per page")
+    session = session or get_default_session()
+
+    async def alone(wallet: str):
+        return await get_wallet_era_full(wallet, pro_code, session=session, bulk=bulk, keep_page=keep_page)
+
+    if len(wallets) == 1 or _era_batching.get(session.base_url) is False:
+        return list(await asyncio.gather(*map(alone, wallets)))
+
+    page = await get_page_content(wallets[0], pro_code, Chain.ERA, session, tuple(wallets[1:]))
+    results: list[tuple[WalletEra, WalletLite] | None] = []
+    retry: dict[int, str] = {}
+    for slot, wallet in enumerate(wallets, start=1):
+        result = None
+        if _slot_holds(page, slot, wallet):
+            result = _parse_era_full(wallet, page, bulk, keep_page, slot)
+        elif slot > 1:
+            _era_batching[session.base_url] = False
+        if result is None:
+            retry[slot] = wallet
+        results.append(result)
+
+    retried = await asyncio.gather(*map(alone, retry.values()))
+    for (slot, wallet), result in zip(retry.items(), retried):
+        results[slot - 1] = result
+        if result is not None and slot > 1:
+            _era_batching[session.base_url] = False
+    _era_batching.setdefault(session.base_url, True)
+
+    return results
 
 def _calc_potential_lite(we: WalletEra, wl: WalletLite) -> tuple[int, int]:
-    counter = 0
-    counter2 = 0
-    if we.balance > 0.005: counter += 1
-    if we.transactions > 10: counter += 1
-    if we.internal_txdone > 2: counter += 1
-    if we.aggregate_eth > 1: counter += 1
-    if we.protocols_amount > 3: counter2 += 1
-    if we.is_native_bridge_used: counter2 += 1
-
-    if wl.transactions > 0: counter += 1
-
-    if counter == 0:
-        return (0, 0)
-    elif counter == 1:
-        if counter2 == 0:
-            return (0, 0)
-        elif counter2 == 1:
-            return (500, 800)
-        elif counter2 == 2:
-            return (800, 1200)
-    elif counter == 2:
-        if counter2 == 0:
-            return (500, 800)
-        elif counter2 == 1:
-            return (800, 1200)
-        elif counter2 == 2:
-            return (1200, 1600)
-    elif counter == 3:
-        if counter2 == 0:
-            return (800, 1200)
-        elif counter2 == 1:
-            return (1200, 1600)
-        elif counter2 == 2:
-            return (1600, 3000)
-    elif counter == 4:
-        if counter2 == 0:
-            return (1200, 1600)
-        elif counter2 == 1:
-            return (1600, 3000)
-        elif counter2 == 2:
-            return (3000, 6000)
-    elif counter == 5:
-        if counter2 == 0:
-            return (1600, 3000)
-        elif counter2 == 1:
-            return (3000, 6000)
-        elif counter2 == 2:
-            return (6000, 8000)
-
-    return (0, 0)
-
-async def get_wallet_zero(wallet: str, pro_code: str) -> WalletZero | None:
-    page = await get_page_content(wallet, pro_code, Chain.ZERO)
-    try:
-        rank = int(get_var_declaration_value(page, "value1_fixed"))
-        transactions = int(get_var_declaration_value(page, "valuePro2"))
-        bridged = float(get_var_declaration_value(page, "valuePro3"))
-        source_chains = int(get_var_declaration_value(page, "valuePro4"))
-        destination_chains = int(get_var_declaration_value(page, "valuePro5"))
-        interacted_contracts = int(get_var_declaration_value(page, "valuePro6"))
-        active_days = int(get_var_declaration_value(page, "valuePro7"))
-        active_weeks = int(get_var_declaration_value(page, "valuePro8"))
-        active_months = int(get_var_declaration_value(page, "valuePro9"))
-        potential_earning: tuple[int, int] | None = None
-    except AttributeError:
-        return None
-    
-    return WalletZero(
-            wallet=wallet,
-            rank=rank,
-            transactions=transactions,
-            bridged=bridged,
-            source_chains=source_chains,
-            destination_chains=destination_chains,
-            interacted_contracts=interacted_contracts,
-            active_days=active_days,
-            active_weeks=active_weeks,
-            active_months=active_months,
-            potential_earning=potential_earning
-            )
+    return scoring.default_scorer.score(we, wl)
 
-async def get_wallet_linea_mainnet(wallet: str, pro_code: str) -> WalletLinea | None:
-    page = await get_page_content(wallet, pro_code, Chain.LINEA)
-    try:
-        balance_eth = float(get_var_declaration_value(page, "value1_unfixed_mn"))
-        if balance_eth == -1: balance_eth = None
-        balance_usdc = float(get_var_declaration_value(page, "valuePro1_mn"))
-        if balance_usdc == -1: balance_usdc = None
-        transactions = float(get_var_declaration_value(page, "valuePro2_mn"))
-        is_native_bridge_used = bool(int(get_var_declaration_value(page, "valuePro3_mn")))
-        first_tx_date = get_var_declaration_value(page, "valuePro4_mn")
-        tx_months = str_array(get_var_declaration_value(page, "valuePro5_mn"))
-        active_months = int(get_var_declaration_value(page, "valuePro51_mn"))
-        active_weeks = int(get_var_declaration_value(page, "valuePro52_mn"))
-        active_days = int(get_var_declaration_value(page, "valuePro53_mn"))
-        last_tx_date = get_var_declaration_value(page, "valuePro6_mn")
-    except AttributeError:
-        return None
-    
-    return WalletLinea(
-            wallet=wallet,
-            balance_eth=balance_eth,
-            balance_usdc=balance_usdc,
-            transactions=transactions,
-            is_native_bridge_used=is_native_bridge_used,
-            first_tx_date=first_tx_date,
-            tx_months=tx_months,
-            active_months=active_months,
-            active_weeks=active_weeks,
-            active_days=active_days,
-            last_tx_date=last_tx_date,
-            )
+@wallet_lookup(Chain.ZERO)
+async def get_wallet_zero(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletZero | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.ZERO, session)
 
-async def get_wallet_linea_testnet(wallet: str, pro_code: str) -> WalletLinea | None:
-    page = await get_page_content(wallet, pro_code, Chain.LINEA)
-    try:
-        balance_eth = float(get_var_declaration_value(page, "value1_unfixed"))
-        if balance_eth == -1: balance_eth = None
-        balance_usdc = float(get_var_declaration_value(page, "valuePro1"))
-        if balance_usdc == -1: balance_usdc = None
-        transactions = float(get_var_declaration_value(page, "valuePro2"))
-        is_native_bridge_used = bool(int(get_var_declaration_value(page, "valuePro3")))
-        first_tx_date = get_var_declaration_value(page, "valuePro4")
-        tx_months = str_array(get_var_declaration_value(page, "valuePro5"))
-        active_months = int(get_var_declaration_value(page, "valuePro51"))
-        active_weeks = int(get_var_declaration_value(page, "valuePro52"))
-        active_days = int(get_var_declaration_value(page, "valuePro53"))
-        last_tx_date = get_var_declaration_value(page, "valuePro6")
-    except AttributeError:
-        return None
-    
-    return WalletLinea(
-            wallet=wallet,
-            balance_eth=balance_eth,
-            balance_usdc=balance_usdc,
-            transactions=transactions,
-            is_native_bridge_used=is_native_bridge_used,
-            first_tx_date=first_tx_date,
-            tx_months=tx_months,
-            active_months=active_months,
-            active_weeks=active_weeks,
-            active_days=active_days,
-            last_tx_date=last_tx_date,
-            )
+    return _parse(ZERO_SCHEMA, wallet, page, bulk)
 
+@wallet_lookup(Chain.LINEA)
+async def get_wallet_linea_mainnet(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletLinea | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.LINEA, session)
 
-async def get_wallet_starknet(wallet: str, pro_code: str) -> WalletStarknet | None:
-    page = await get_page_content(wallet, pro_code, Chain.STARKNET)
-    try:
-        transactions = int(get_var_declaration_value(page, "value1_fixed"))
-        tx_months = str(get_var_declaration_value(page, "valuePro5"))
-        active_months = int(get_var_declaration_value(page, "activeMonthsPro1"))
-        active_weeks = int(get_var_declaration_value(page, "activeWeeksPro1"))
-        active_days = int(get_var_declaration_value(page, "activeDaysPro1"))
-        did_swap = bool(int(get_var_declaration_value(page, "did_swap1Bool")))
-        did_mint = bool(int(get_var_declaration_value(page, "did_mint1Bool")))
-        did_add_liquidity = bool(int(get_var_declaration_value(page, "did_addLiquidity1Bool")))
-        did_remove_liquidity = bool(int(get_var_declaration_value(page, "did_removeLiquidity1Bool")))
-        total_gas = float(get_var_declaration_value(page, "totalGasfees1unfixed"))
-        aggregate_tx = float(get_var_declaration_value(page, "aggregateValueTxPro1unfixed"))
-        first_transaction = get_elem_content(page, "valueFirstTx1")
-        last_transaction = str(get_var_declaration_value(page, "lastTxPro1"))
-    except AttributeError:
-        return None
-
-    return WalletStarknet(
-            wallet=wallet,
-            transactions=transactions,
-            tx_months=tx_months,
-            active_months=active_months,
-            active_weeks=active_weeks,
-            active_days=active_days,
-            did_swap=did_swap,
-            did_mint=did_mint,
-            did_add_liquidity=did_add_liquidity,
-            did_remove_liquidity=did_remove_liquidity,
-            total_gas=total_gas,
-            aggregate_tx=aggregate_tx,
-            first_transaction=first_transaction,
-            last_transaction=last_transaction
-            )
+    return _parse(LINEA_MAINNET_SCHEMA, wallet, page, bulk)
 
-async def get_wallet_scroll(wallet: str, pro_code: str) -> WalletScroll | None:
-    page = await get_page_content(wallet, pro_code, Chain.SCROLL)
-    try:
-        balance_eth = float(get_var_declaration_value(page, "value1_fixed"))
-        balance_usdc = float(get_var_declaration_value(page, "valuePro1"))
-        transactions = int(get_var_declaration_value(page, "valuePro2"))
-        is_native_bridge_used = bool(int(get_var_declaration_value(page, "valuePro3")))
-        first_tx_date = get_var_declaration_value(page, "valuePro4")
-        tx_months = str_array(get_var_declaration_value(page, "valuePro5"))
-        last_tx_date = get_var_declaration_value(page, "valuePro6")
-    except AttributeError:
-        return None
-    
-    return WalletScroll(
-            wallet=wallet,
-            balance_eth=balance_eth,
-            balance_usdc=balance_usdc,
-            transactions=transactions,
-            is_native_bridge_used=is_native_bridge_used,
-            first_tx_date=first_tx_date,
-            tx_months=tx_months,
-            last_tx_date=last_tx_date
-            )
+@wallet_lookup(Chain.LINEA)
+async def get_wallet_linea_testnet(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletLinea | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.LINEA, session)
+
+    return _parse(LINEA_TESTNET_SCHEMA, wallet, page, bulk)
+
+@wallet_lookup(Chain.LINEA)
+async def get_wallet_linea(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> tuple[WalletLinea | None, WalletLinea | None]:
+    # (mainnet, testnet): both networks are on the same page
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.LINEA, session)
+
+    return _parse(LINEA_MAINNET_SCHEMA, wallet, page, bulk), _parse(LINEA_TESTNET_SCHEMA, wallet, page, bulk)
+
+@wallet_lookup(Chain.STARKNET)
+async def get_wallet_starknet(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletStarknet | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.STARKNET, session)
+
+    return _parse(STARKNET_SCHEMA, wallet, page, bulk)
+
+@wallet_lookup(Chain.SCROLL)
+async def get_wallet_scroll(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletScroll | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.SCROLL, session)
+
+    return _parse(SCROLL_SCHEMA, wallet, page, bulk)
+
+@wallet_lookup(Chain.SYBIL)
+async def get_wallet_sybil(wallet: str, pro_code: str, page: Page | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletSybil | None:
+    if not page:
+        page = await get_page_content(wallet, pro_code, Chain.SYBIL, session)
+
+    return _parse(SYBIL_SCHEMA, wallet, page, bulk)
+
+
+SCHEMAS = {
+        Chain.ZERO: ZERO_SCHEMA,
+        Chain.STARKNET: STARKNET_SCHEMA,
+        Chain.SCROLL: SCROLL_SCHEMA,
+        Chain.LINEA: LINEA_MAINNET_SCHEMA,
+        Chain.SYBIL: SYBIL_SCHEMA,
+        }
+
+def parse_page(chain: Chain, wallet: str, page: Page, bulk: bool = False, keep_page: bool | None = None) -> BaseModel | None:
+    # synchronous and picklable, for parsing in worker processes; reads the same
+    # model as the chain's lookup in zkparser.bulk.CHAIN_LOOKUPS
+    if chain == Chain.ERA:
+        return _parse_era(wallet, page, bulk, keep_page)
+    if chain not in SCHEMAS:
+        raise WrongChainException(chain)
 
-async def get_wallet_sybil(wallet: str, pro_code: str) -> WalletSybil | None:
-    page = await get_page_content(wallet, pro_code, Chain.SYBIL)
-    try:
-        is_blacklisted = bool(int(get_var_declaration_value(page, "blacklisted12")))
-    except AttributeError:
-        return None
-    
-    return WalletSybil(
-            wallet=wallet,
-            is_blacklisted=is_blacklisted
+    return _parse(SCHEMAS[chain], wallet, page, bulk)
+
+
+async def get_wallet_lookups(wallet: str, pro_code: str, lookups: list, session: ZkSession | None = None) -> list:
+    # runs several get_wallet_* functions for one wallet, downloading each
+    # distinct page only once however many lookups read it
+    chains = list(dict.fromkeys(lookup.chain for lookup in lookups))
+    pages = await asyncio.gather(*[get_page_content(wallet, pro_code, chain, session) for chain in chains])
+    pages = dict(zip(chains, pages))
+
+    return [await lookup(wallet, pro_code, pages[lookup.chain], session) for lookup in lookups]
+
+
+class WalletProfile(BaseModel):
+    wallet: str
+    era: WalletEra | None = None
+    lite: WalletLite | None = None
+    zero: WalletZero | None = None
+    starknet: WalletStarknet | None = None
+    scroll: WalletScroll | None = None
+    linea_mainnet: WalletLinea | None = None
+    linea_testnet: WalletLinea | None = None
+    sybil: WalletSybil | None = None
+    errors: dict[Chain, str] = {} # chains whose lookup failed, with the error
+
+# one lookup per chain page, and the profile fields it fills
+PROFILE_LOOKUPS = {
+        Chain.ERA: (get_wallet_era_full, ("era", "lite")),
+        Chain.ZERO: (get_wallet_zero, ("zero",)),
+        Chain.STARKNET: (get_wallet_starknet, ("starknet",)),
+        Chain.SCROLL: (get_wallet_scroll, ("scroll",)),
+        Chain.LINEA: (get_wallet_linea, ("linea_mainnet", "linea_testnet")),
+        Chain.SYBIL: (get_wallet_sybil, ("sybil",)),
+        }
+
+async def get_wallet_profile(wallet: str, pro_code: str, chains: list[Chain] | None = None, session: ZkSession | None = None, bulk: bool = False) -> WalletProfile:
+    # looks the wallet up on every chain (default all of PROFILE_LOOKUPS) at once
+    # over one session; a chain that fails leaves its fields None and its error
+    # in `errors` instead of failing the profile
+    chains = list(PROFILE_LOOKUPS) if chains is None else list(dict.fromkeys(chains))
+    for chain in chains:
+        if chain not in PROFILE_LOOKUPS: raise WrongChainException(chain)
+    session = session or get_default_session()
+
+    results = await asyncio.gather(
+            *[PROFILE_LOOKUPS[chain][0](wallet, pro_code, session=session, bulk=bulk) for chain in chains],
+            return_exceptions=True,
             )
-    
-    
-    
-    
-    
-    
-    
+    fields, errors = {}, {}
+    for chain, result in zip(chains, results):
+        if isinstance(result, Exception):
+            errors[chain] = repr(result)
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        names = PROFILE_LOOKUPS[chain][1]
+        if len(names) == 1:
+            result = (result,)
+        fields.update(zip(names, result or (None,) * len(names)))
+
+    return _build(WalletProfile, bulk, wallet=wallet, errors=errors, **fields)